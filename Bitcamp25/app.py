@@ -1,47 +1,50 @@
-import requests
 import json
 from pprint import pprint
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import os
+from datetime import date
+from pydantic import ValidationError
 from retell import Retell
 
+from batch_writes import BatchRequest, run_batch
+from instrumentation import create_web_call, instrument, render_metrics
+from ledger_replica import LedgerReplica
+from location_service import LocationService, parse_open_at
+from nessie_gateway import TRANSACTION_TYPES, NessieError, nessie
+from retell_config import RETELL_API_KEY
+from retell_token_pool import RETELL_TOKEN_POOL_AGENTS, WebCallTokenPool
+from spending_analytics import QUERY_ARGS, SpendingAnalytics
+from transaction_export import EXPORT_FORMATS, export_customer
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
-
-# Retell API key - in production, store this in environment variables
-RETELL_API_KEY = "key_8b4cb3a3d82ca7bb3a100e558ce8"
+instrument(app)  # Per-route timings, upstream spans and a JSON access log - see /metrics
 
 # Initialize the Retell client
 retell_client = Retell(api_key=RETELL_API_KEY)
 
-def get_nessie_customers():
+# Optional pool of pre-created web calls (set RETELL_TOKEN_POOL_AGENTS to enable)
+token_pool = WebCallTokenPool(retell_client, RETELL_TOKEN_POOL_AGENTS) if RETELL_TOKEN_POOL_AGENTS else None
+
+# Local replica of Nessie customers, accounts and transactions for fast queries
+ledger = LedgerReplica()
+analytics = SpendingAnalytics(ledger)
+
+# Snapshot of ATMs and branches for local proximity lookups
+locations = LocationService(nessie)
+
+@app.before_request
+def start_background_workers():
     """
-    Function to fetch customers from the Nessie API
+    Start the ledger sync, location refresh and token pool threads on the first
+    request, so they run in whichever process serves requests (never the debug
+    reloader's parent) however the app is started. Later calls are no-ops.
     """
-    url = "http://api.nessieisreal.com/customers"
-    
-    # API key as a query parameter
-    params = {
-        "key": "f1fbb5f9a7bfdc1597fafdf76476cfa7"
-    }
-    
-    # Set headers to accept JSON
-    headers = {
-        "Accept": "application/json"
-    }
-    
-    # Make the GET request
-    response = requests.get(url, params=params, headers=headers)
-    
-    # Check if the request was successful
-    if response.status_code == 200:
-        # Parse and return the JSON data
-        return response.json()
-    else:
-        print(f"Error: {response.status_code}")
-        print(response.text)
-        return None
+    ledger.start()
+    locations.start()
+    if token_pool is not None:
+        token_pool.start()
 
 @app.route('/api/generate-token', methods=['POST'])
 def generate_token():
@@ -52,8 +55,13 @@ def generate_token():
         if not agent_id:
             return jsonify({"error": "agent_id is required"}), 400
         
+        # Hand out a pre-created web call if the agent is pooled
+        if token_pool is not None:
+            return jsonify(token_pool.get_token(agent_id))
+        
         # Use Retell SDK to create a web call
-        web_call_response = retell_client.call.create_web_call(
+        web_call_response = create_web_call(
+            retell_client,
             agent_id=agent_id,
         )
         
@@ -66,6 +74,210 @@ def generate_token():
         print(f"Error generating token: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/accounts/<account_id>/activity')
+def account_activity(account_id):
+    """
+    Deposits, withdrawals and transfers for an account in one round trip,
+    merged and sorted newest first
+    """
+    try:
+        return jsonify(nessie.get_account_activity(account_id))
+    except NessieError as e:
+        print(f"Error fetching account activity: {str(e)}")
+        return jsonify({"error": str(e)}), e.status_code
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    """
+    Nessie response cache counters, for sizing the cache
+    """
+    if nessie.cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **nessie.cache.stats()})
+
+@app.route('/api/token-pool/stats')
+def token_pool_stats():
+    """
+    Web call token pool depth, hit rate and refill latency
+    """
+    if token_pool is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **token_pool.stats()})
+
+def ledger_query_args():
+    """
+    Date range, type filter and paging arguments shared by the ledger endpoints
+    """
+    types = [t for value in request.args.getlist('type') for t in value.split(',') if t]
+    invalid = set(types) - set(TRANSACTION_TYPES.values())
+    if invalid:
+        raise ValueError(f"Unknown transaction type(s): {', '.join(sorted(invalid))}")
+
+    limit = int(request.args.get('limit', 100))
+    offset = int(request.args.get('offset', 0))
+    if not 1 <= limit <= 1000 or offset < 0:
+        raise ValueError("limit must be between 1 and 1000 and offset must not be negative")
+
+    # Dates are compared as YYYY-MM-DD strings, so anything else would filter silently wrong
+    dates = {}
+    for name in ('start', 'end'):
+        value = request.args.get(name)
+        try:
+            dates[name] = date.fromisoformat(value).isoformat() if value else None
+        except ValueError:
+            raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+    return {
+        **dates,
+        "types": types,
+        "limit": limit,
+        "offset": offset,
+    }
+
+@app.route('/api/ledger/sync', methods=['POST'])
+def ledger_sync():
+    """
+    Pull new and changed records from Nessie into the local replica
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({"error": "Body must be a JSON object"}), 400
+        customer_ids = data.get('customer_ids')
+        if customer_ids is not None and (
+            not isinstance(customer_ids, list) or not customer_ids
+            or not all(isinstance(c, str) and c for c in customer_ids)
+        ):
+            return jsonify({"error": "customer_ids must be a non-empty list of customer id strings"}), 400
+        return jsonify(ledger.sync(customer_ids))
+    except NessieError as e:
+        print(f"Error syncing ledger: {str(e)}")
+        return jsonify({"error": str(e)}), e.status_code
+
+@app.route('/api/ledger/accounts/<account_id>/transactions')
+def ledger_account_transactions(account_id):
+    try:
+        return jsonify(ledger.transactions(account_id=account_id, **ledger_query_args()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/ledger/customers/<customer_id>/transactions')
+def ledger_customer_transactions(customer_id):
+    try:
+        return jsonify(ledger.transactions(customer_id=customer_id, **ledger_query_args()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/ledger/customers/<customer_id>/accounts')
+def ledger_customer_accounts(customer_id):
+    return jsonify(ledger.accounts(customer_id))
+
+@app.route('/api/analytics/accounts/<account_id>/<query>')
+def account_analytics(account_id, query):
+    """
+    Aggregates over an account's transactions in the ledger replica:
+    summary, totals, monthly, compare, largest or balance
+    """
+    if query not in QUERY_ARGS:
+        return jsonify({"error": f"Unknown analytics query: {query}"}), 404
+
+    kwargs = {}
+    try:
+        for name, (cast, allowed) in QUERY_ARGS[query].items():
+            if name in request.args:
+                kwargs[name] = cast(request.args[name])
+                if cast is int:
+                    if not 1 <= kwargs[name] <= allowed:
+                        raise ValueError(f"{name} must be between 1 and {allowed}")
+                elif allowed and kwargs[name] not in allowed:
+                    raise ValueError(f"{name} must be one of {', '.join(allowed)}")
+        result = analytics.query(account_id, query, **kwargs)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if result is None:
+        return jsonify({"error": "Account not found in ledger - sync it first with /api/ledger/sync"}), 404
+    return jsonify(result)
+
+@app.route('/api/locations/nearest')
+def nearest_locations():
+    """
+    Nearest ATMs/branches to lat/lng from the local snapshot, optionally within
+    `radius` miles and filtered by type, accessible, language and open_at (HH:MM, with day)
+    """
+    try:
+        lat = float(request.args['lat'])
+        lng = float(request.args['lng'])
+        k = int(request.args.get('k', 5))
+        radius = float(request.args['radius']) if 'radius' in request.args else None
+        if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+            raise ValueError("lat/lng out of range")
+        if not 1 <= k <= 100:
+            raise ValueError("k must be between 1 and 100")
+
+        filters = {}
+        if request.args.get('type'):
+            if request.args['type'] not in ('atm', 'branch'):
+                raise ValueError("type must be atm or branch")
+            filters['kind'] = request.args['type']
+        if 'accessible' in request.args:
+            filters['accessible'] = request.args['accessible'].lower() in ('1', 'true', 'yes')
+        if request.args.get('language'):
+            filters['language'] = request.args['language']
+        if request.args.get('open_at'):
+            filters['open_at'] = parse_open_at(request.args['open_at'], request.args.get('day'))
+    except KeyError as e:
+        return jsonify({"error": f"{e.args[0]} is required"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        return jsonify(locations.nearest(lat, lng, k=k, radius=radius, **filters))
+    except NessieError as e:
+        print(f"Error loading locations: {str(e)}")
+        return jsonify({"error": str(e)}), e.status_code
+
+@app.route('/api/batch', methods=['POST'])
+def batch_write():
+    """
+    Run a list of deposits, withdrawals and transfers concurrently, streaming
+    one NDJSON result line per operation as it completes
+    """
+    try:
+        batch = BatchRequest.model_validate(request.get_json(silent=True) or {})
+    except ValidationError as e:
+        # Nothing runs unless every operation is valid
+        return jsonify({"error": "Invalid batch", "details": e.errors(include_url=False, include_context=False)}), 400
+
+    return Response(stream_with_context(run_batch(nessie, batch)), mimetype='application/x-ndjson')
+
+@app.route('/api/customers/<customer_id>/export')
+def export_transactions(customer_id):
+    """
+    Stream every transaction across a customer's accounts as NDJSON, CSV or Parquet,
+    as of the last ledger sync
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if not ledger.accounts(customer_id):
+        return jsonify({"error": "No synced accounts for this customer"}), 404
+    try:
+        chunks = export_customer(ledger, customer_id, export_format)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="transactions-{customer_id}.{export_format}"'},
+    )
+
+@app.route('/metrics')
+def metrics():
+    """
+    Request and upstream call latencies in Prometheus text format
+    """
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def index():
     return "Server is running. Use /api/generate-token to create a Retell access token."
@@ -0,0 +1,119 @@
+"""
+Async (ASGI) serving mode for the upstream-bound routes of app.py.
+
+This is not a drop-in replacement for app.py. It serves only these routes,
+and never uses the Retell token pool (RETELL_TOKEN_POOL_AGENTS is ignored):
+
+    POST /api/generate-token
+    GET  /api/accounts/<account_id>/activity
+    GET  /metrics
+    GET  /
+
+The ledger, analytics, locations, batch, export and cache/token pool stats
+routes are only served by app.py.
+
+Upstream calls to Retell and Nessie are awaited instead of blocking a worker
+thread, so one process holds many requests in flight without a thread each.
+That alone doesn't raise throughput: on a single CPU shared with the stub
+servers, benchmarks/load_test.py measures both modes at about the same req/s,
+with async ahead on p99 latency and CPU per token request once there are 200
+concurrent requests against 1 s upstreams.
+
+    uvicorn asgi_app:app --port 5000
+"""
+import contextlib
+import os
+
+import httpx
+from retell import AsyncRetell, DefaultAsyncHttpxClient
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from instrumentation import create_web_call_async, render_metrics
+from nessie_gateway import AsyncNessieGateway, NessieError
+from retell_config import RETELL_API_KEY
+
+# Connections kept to Retell. The SDK default of 100 (20 kept alive) queues calls
+# in httpx's pool under load, and scanning that queue gets CPU-bound
+RETELL_POOL_SIZE = int(os.environ.get("RETELL_POOL_SIZE", "200"))
+
+# Initialize the async clients (Retell honours RETELL_BASE_URL, Nessie NESSIE_BASE_URL)
+retell_client = AsyncRetell(
+    api_key=RETELL_API_KEY,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=RETELL_POOL_SIZE, max_keepalive_connections=RETELL_POOL_SIZE)
+    ),
+)
+nessie = AsyncNessieGateway()
+
+
+async def generate_token(request):
+    try:
+        data = await request.json()
+        agent_id = data.get('agent_id')
+
+        if not agent_id:
+            return JSONResponse({"error": "agent_id is required"}, status_code=400)
+
+        # Use Retell SDK to create a web call
+        web_call_response = await create_web_call_async(
+            retell_client,
+            agent_id=agent_id,
+        )
+
+        return JSONResponse(web_call_response.model_dump())
+
+    except Exception as e:
+        print(f"Error generating token: {str(e)}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def account_activity(request):
+    """
+    Deposits, withdrawals and transfers for an account in one round trip,
+    merged and sorted newest first
+    """
+    try:
+        return JSONResponse(await nessie.get_account_activity(request.path_params['account_id']))
+    except NessieError as e:
+        print(f"Error fetching account activity: {str(e)}")
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+
+
+async def metrics(request):
+    """
+    Upstream Retell and Nessie call latencies in Prometheus text format
+    """
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
+
+async def index(request):
+    return PlainTextResponse("Server is running. Use /api/generate-token to create a Retell access token.")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await nessie.close()
+    await retell_client.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/generate-token', generate_token, methods=['POST']),
+        Route('/api/accounts/{account_id}/activity', account_activity),
+        Route('/metrics', metrics),
+        Route('/', index),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    print("Starting ASGI server...")
+    uvicorn.run(app, port=5000)
@@ -0,0 +1,136 @@
+import contextvars
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from typing import Annotated, ClassVar, List, Literal, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from nessie_gateway import NESSIE_POOL_SIZE, NessieError
+
+BATCH_MAX_OPERATIONS = int(os.environ.get("BATCH_MAX_OPERATIONS", "1000"))
+BATCH_DEFAULT_CONCURRENCY = int(os.environ.get("BATCH_DEFAULT_CONCURRENCY", "8"))
+# More workers than pooled Nessie connections would just queue on the pool
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", str(NESSIE_POOL_SIZE)))
+BATCH_MAX_ATTEMPTS = int(os.environ.get("BATCH_MAX_ATTEMPTS", "3"))
+BATCH_BACKOFF = float(os.environ.get("BATCH_BACKOFF", "0.2"))
+
+# Nessie writes aren't idempotent, so only failures where Nessie turned the
+# request away unprocessed are retried: rate limiting and unavailability, plus
+# requests that never connected (NessieError.reached is False)
+RETRYABLE_STATUS = {429, 503}
+
+
+class MoneyMovement(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    account_id: str = Field(min_length=1)
+    amount: float = Field(gt=0)
+    medium: Literal["balance", "rewards"] = "balance"
+    transaction_date: Optional[date] = None
+    status: Optional[Literal["pending", "cancelled", "completed"]] = None
+    description: Optional[str] = None
+
+    def endpoint(self):
+        return f"/accounts/{self.account_id}/{self.resource}"
+
+    def payload(self):
+        """
+        Request body Nessie expects - everything but the routing fields
+        """
+        return self.model_dump(mode="json", exclude={"op", "account_id"}, exclude_none=True)
+
+
+class Deposit(MoneyMovement):
+    op: Literal["deposit"]
+    resource: ClassVar[str] = "deposits"
+
+
+class Withdrawal(MoneyMovement):
+    op: Literal["withdrawal"]
+    resource: ClassVar[str] = "withdrawals"
+
+
+class Transfer(MoneyMovement):
+    op: Literal["transfer"]
+    resource: ClassVar[str] = "transfers"
+    payee_id: str = Field(min_length=1)
+
+
+Operation = Annotated[Union[Deposit, Withdrawal, Transfer], Field(discriminator="op")]
+
+
+class BatchRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    operations: List[Operation] = Field(min_length=1, max_length=BATCH_MAX_OPERATIONS)
+    concurrency: int = Field(default=BATCH_DEFAULT_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY)
+
+
+def run_operation(gateway, operation, max_attempts=BATCH_MAX_ATTEMPTS, backoff=BATCH_BACKOFF):
+    """
+    POST one operation, retrying with exponential backoff and jitter only
+    when Nessie certainly didn't apply it, so money is never moved twice
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return gateway.post(operation.endpoint(), operation.payload()), attempt
+        except NessieError as e:
+            retryable = not e.reached or e.status_code in RETRYABLE_STATUS
+            if not retryable or attempt == max_attempts:
+                e.attempts = attempt
+                raise
+            time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+
+def outcome_unknown(error):
+    """
+    Whether a failed write may still have been applied - a server error or a
+    timeout after the request went out. These are reported, never resent.
+    """
+    return error.reached and error.status_code >= 500 and error.status_code not in RETRYABLE_STATUS
+
+
+def run_batch(gateway, batch):
+    """
+    Run a validated batch on a bounded worker pool, yielding one NDJSON line
+    per operation as it finishes and a summary line at the end
+    """
+    started = time.perf_counter()
+    succeeded = failed = unknown = 0
+    executor = ThreadPoolExecutor(max_workers=batch.concurrency, thread_name_prefix="batch")
+    try:
+        futures = {
+            executor.submit(contextvars.copy_context().run, run_operation, gateway, operation): (index, operation)
+            for index, operation in enumerate(batch.operations)
+        }
+        for future in as_completed(futures):
+            index, operation = futures[future]
+            line = {"index": index, "op": operation.op, "account_id": operation.account_id}
+            try:
+                result, attempts = future.result()
+                line.update(status="ok", attempts=attempts, result=result.get("objectCreated", result))
+                succeeded += 1
+            except NessieError as e:
+                line.update(status="unknown" if outcome_unknown(e) else "error", attempts=getattr(e, "attempts", 1),
+                            error=str(e), status_code=e.status_code)
+                if line["status"] == "unknown":
+                    unknown += 1
+                else:
+                    failed += 1
+            yield json.dumps(line) + "\n"
+
+        yield json.dumps({
+            "done": True,
+            "succeeded": succeeded,
+            "failed": failed,
+            # May or may not have gone through - check the account before resending
+            "unknown": unknown,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }) + "\n"
+    finally:
+        # Stop queued operations if the client goes away mid-stream
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,119 @@
+"""
+NumPy spending analytics vs. a pure-Python loop over the same transactions.
+
+    python benchmarks/analytics_bench.py --sizes 1000 10000 50000
+"""
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+import spending_analytics as sa  # noqa: E402
+from stub_nessie import DESCRIPTIONS  # noqa: E402
+
+TODAY = date.today()
+
+
+def synthetic_rows(count, seed=0):
+    """
+    Rows in the shape LedgerReplica.account_columns returns, oldest first
+    """
+    random.seed(seed)
+    types = list(sa.TYPE_CODES)
+    rows = [
+        ((TODAY - timedelta(days=random.randint(0, 730))).isoformat(), random.choice(types),
+         round(random.uniform(5, 500), 2), random.choice(DESCRIPTIONS), random.random() < 0.5)
+        for _ in range(count)
+    ]
+    rows.sort()
+    return rows
+
+
+def signed(row):
+    day, kind, amount, description, outgoing = row
+    return -amount if kind == "withdrawal" or (kind == "transfer" and outgoing) else amount
+
+
+def python_totals(rows):
+    spent, received = defaultdict(float), defaultdict(float)
+    for row in rows:
+        amount = signed(row)
+        if amount < 0:
+            spent[row[3]] -= amount
+        else:
+            received[row[3]] += amount
+    return sorted(set(spent) | set(received), key=lambda name: (-spent[name], -received[name]))
+
+
+def python_monthly(rows, window=3):
+    spent = defaultdict(float)
+    for row in rows:
+        amount = signed(row)
+        if amount < 0:
+            spent[row[0][:7]] -= amount
+    months = sorted(spent)
+    return [sum(spent[m] for m in months[max(0, i - window + 1):i + 1]) / min(window, i + 1)
+            for i in range(len(months))]
+
+
+def python_largest(rows, n=5):
+    return heapq.nlargest(n, (-signed(row) for row in rows if signed(row) < 0))
+
+
+def python_balance(rows, balance, days=30):
+    first = (TODAY - timedelta(days=days - 1)).isoformat()
+    daily = defaultdict(float)
+    for row in rows:
+        if row[0] >= first:
+            daily[row[0]] += signed(row)
+    balances, running = [], balance
+    for offset in range(days):
+        day = (TODAY - timedelta(days=offset)).isoformat()
+        balances.append(running)
+        running -= daily[day]
+    return sum(balances) / days
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'transactions':>12} {'query':<9} {'python ms':>10} {'numpy ms':>9} {'speedup':>8}")
+    for size in args.sizes:
+        rows = synthetic_rows(size)
+        load_ms = timed(lambda: sa.AccountColumns(rows, 5000.0), args.repeat)
+        columns = sa.AccountColumns(rows, 5000.0)
+
+        cases = [
+            ("totals", lambda: python_totals(rows), lambda: sa.totals(columns)),
+            ("monthly", lambda: python_monthly(rows), lambda: sa.monthly(columns)),
+            ("largest", lambda: python_largest(rows), lambda: sa.largest(columns)),
+            ("balance", lambda: python_balance(rows, 5000.0), lambda: sa.average_balance(columns)),
+        ]
+        for name, python_fn, numpy_fn in cases:
+            python_ms, numpy_ms = timed(python_fn, args.repeat), timed(numpy_fn, args.repeat)
+            print(f"{size:>12} {name:<9} {python_ms:>10.2f} {numpy_ms:>9.2f} {python_ms / numpy_ms:>7.1f}x")
+        print(f"{size:>12} {'(load)':<9} {'':>10} {load_ms:>9.2f}   one-off per data version")
+
+
+if __name__ == "__main__":
+    main()
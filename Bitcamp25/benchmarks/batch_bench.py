@@ -0,0 +1,53 @@
+"""
+Batch write throughput against a stub Nessie server as concurrency grows:
+
+    python benchmarks/batch_bench.py --operations 200 --latency 0.05 --concurrency 1 2 4 8 16
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from batch_writes import BatchRequest, run_batch  # noqa: E402
+from nessie_gateway import NessieGateway  # noqa: E402
+from stub_nessie import ACCOUNT_ID, StubServer, create_app, seed_store  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub Nessie latency per request (s)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    kinds = ["deposit", "withdrawal", "transfer"]
+    operations = [
+        {"op": kinds[i % 3], "account_id": ACCOUNT_ID, "amount": 10 + i,
+         **({"payee_id": "5f1c2b9a8d3e4f6a7b8c9d0e"} if kinds[i % 3] == "transfer" else {})}
+        for i in range(args.operations)
+    ]
+
+    with StubServer(create_app(seed_store(0), latency=args.latency)) as stub:
+        gateway = NessieGateway(base_url=stub.url, pool_size=max(args.concurrency))
+        print(f"{args.operations} operations, stub latency {args.latency * 1000:.0f} ms\n")
+        print(f"{'concurrency':>11} {'ops/s':>8} {'first result ms':>16} {'total ms':>9} {'failed':>7} {'unknown':>8}")
+
+        for concurrency in args.concurrency:
+            batch = BatchRequest.model_validate({"operations": operations, "concurrency": concurrency})
+            started = time.perf_counter()
+            first = None
+            for line in run_batch(gateway, batch):
+                first = first or time.perf_counter() - started
+                result = json.loads(line)
+            elapsed = time.perf_counter() - started
+            print(f"{concurrency:>11} {args.operations / elapsed:>8.1f} {first * 1000:>16.1f} "
+                  f"{elapsed * 1000:>9.0f} {result['failed']:>7} {result['unknown']:>8}")
+        gateway.close()
+
+
+if __name__ == "__main__":
+    main()
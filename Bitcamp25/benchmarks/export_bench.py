@@ -0,0 +1,125 @@
+"""
+Streaming export throughput and peak memory over a synthetic ledger replica.
+
+Fills a temporary replica with --rows transactions spread over a customer's
+accounts, then exports them in a fresh process so the peak RSS reflects the
+export alone. Exits non-zero if the peak goes over --max-rss-mb:
+
+    python benchmarks/export_bench.py --rows 1000000 --format ndjson csv parquet --max-rss-mb 200
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from ledger_replica import LedgerReplica  # noqa: E402
+from stub_nessie import CUSTOMER_ID, DESCRIPTIONS  # noqa: E402
+from transaction_export import export_customer  # noqa: E402
+
+ACCOUNTS = 4
+TYPES = ["deposit", "withdrawal", "transfer"]
+
+
+def populate(db_path, rows, seed=0):
+    random.seed(seed)
+    ledger = LedgerReplica(db_path=db_path)
+    db = ledger._connection()
+    account_ids = [f"{CUSTOMER_ID[:-1]}{i}" for i in range(ACCOUNTS)]
+    db.executemany(
+        "INSERT INTO accounts (id, customer_id, type, balance, data, hash) VALUES (?, ?, ?, ?, ?, '')",
+        [(account_id, CUSTOMER_ID, "Checking", 1000.0,
+          json.dumps({"_id": account_id, "customer_id": CUSTOMER_ID, "type": "Checking", "nickname": f"Account {i}"}))
+         for i, account_id in enumerate(account_ids)],
+    )
+
+    today = date.today()
+
+    def transactions():
+        for i in range(rows):
+            account_id, kind = account_ids[i % ACCOUNTS], random.choice(TYPES)
+            tx_id = hashlib.md5(str(i).encode()).hexdigest()[:24]
+            day = (today - timedelta(days=random.randrange(3650))).isoformat()
+            amount = round(random.uniform(1, 500), 2)
+            description = random.choice(DESCRIPTIONS)
+            data = {"_id": tx_id, "type": kind, "transaction_date": day, "amount": amount, "status": "completed",
+                    "medium": "balance", "description": description, "payee_id": account_id}
+            yield (tx_id, account_id, CUSTOMER_ID, kind, day, amount, description, account_id, json.dumps(data))
+
+    db.executemany(
+        "INSERT INTO transactions (id, account_id, customer_id, type, date, amount, description, payer_id, data, hash) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, '')",
+        transactions(),
+    )
+    db.commit()
+
+
+def run_export(db_path, export_format):
+    """
+    Child process: export everything, discarding the output, and report as JSON
+    """
+    ledger = LedgerReplica(db_path=db_path)
+    started = time.perf_counter()
+    size = chunks = 0
+    for chunk in export_customer(ledger, CUSTOMER_ID, export_format):
+        size += len(chunk)
+        chunks += 1
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"elapsed": elapsed, "bytes": size, "chunks": chunks, "peak_rss_mb": peak_mb}))
+
+
+def measure(db_path, export_format):
+    """
+    Export in a fresh process and return its elapsed time, output size and peak RSS
+    """
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", db_path, export_format],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--format", nargs="+", default=["ndjson", "csv", "parquet"])
+    parser.add_argument("--max-rss-mb", type=float, default=200)
+    parser.add_argument("--child", nargs=2, metavar=("DB_PATH", "FORMAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_export(*args.child)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "ledger.db")
+        started = time.perf_counter()
+        populate(db_path, args.rows)
+        print(f"populated {args.rows} transactions over {ACCOUNTS} accounts in "
+              f"{time.perf_counter() - started:.1f} s\n")
+
+        print(f"{'format':<8} {'rows/s':>10} {'MB out':>8} {'chunks':>7} {'peak RSS MB':>12}")
+        over = False
+        for export_format in args.format:
+            result = measure(db_path, export_format)
+            over |= result["peak_rss_mb"] > args.max_rss_mb
+            print(f"{export_format:<8} {args.rows / result['elapsed']:>10.0f} {result['bytes'] / 1e6:>8.1f} "
+                  f"{result['chunks']:>7} {result['peak_rss_mb']:>12.1f}")
+
+    if over:
+        print(f"\npeak RSS went over the {args.max_rss_mb:.0f} MB ceiling")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
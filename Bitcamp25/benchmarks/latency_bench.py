@@ -0,0 +1,169 @@
+"""
+Per-endpoint latency of app.py against local stub Retell and Nessie servers.
+
+Every run uses the same seeded stub data, upstream latencies and request mix,
+so results are comparable between commits. Client-side p50/p95/p99 are
+recorded per endpoint, next to the mean time the server spent on each request
+and in Retell and Nessie calls, read from its /metrics. Upstream time is
+summed over calls, so it can exceed the server time when calls run in parallel:
+
+    python benchmarks/latency_bench.py --output latency.json
+    python benchmarks/latency_bench.py --baseline latency.json   # exits 1 on a regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+from collections import defaultdict
+
+import httpx
+
+from load_test import SYNC_SERVER, drive, free_port, percentile, start, wait_until_up
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from stub_nessie import ACCOUNT_ID, CUSTOMER_ID  # noqa: E402
+
+# (method, path, body, Flask route template the server reports it under)
+ENDPOINTS = [
+    ("POST", "/api/generate-token", {"agent_id": "agent_latency_bench"}, "/api/generate-token"),
+    ("GET", f"/api/accounts/{ACCOUNT_ID}/activity", None, "/api/accounts/<account_id>/activity"),
+    ("GET", "/api/locations/nearest?lat=38.9&lng=-77.03&k=5", None, "/api/locations/nearest"),
+    ("GET", f"/api/ledger/customers/{CUSTOMER_ID}/transactions?limit=50", None,
+     "/api/ledger/customers/<customer_id>/transactions"),
+    ("GET", f"/api/analytics/accounts/{ACCOUNT_ID}/summary", None, "/api/analytics/accounts/<account_id>/<query>"),
+    ("GET", f"/api/customers/{CUSTOMER_ID}/export?format=csv", None, "/api/customers/<customer_id>/export"),
+]
+
+SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def scrape(base_url):
+    """
+    _sum and _count of each histogram series on /metrics, keyed by (name, labels)
+    """
+    series = {}
+    for line in httpx.get(base_url + "/metrics").text.splitlines():
+        match = SAMPLE.match(line)
+        if match and match.group(1).endswith(("_sum", "_count")):
+            series[(match.group(1), frozenset(LABEL.findall(match.group(2))))] = float(match.group(3))
+    return series
+
+
+def server_breakdown(before, after, method, route):
+    """
+    Mean ms per request spent in the server overall and in each upstream service
+    between two scrapes - endpoints are run one at a time, so every upstream
+    call in between was made by `route`
+    """
+    totals = defaultdict(float)
+    for (name, labels), value in after.items():
+        labels = dict(labels)
+        change = value - before.get((name, frozenset(labels.items())), 0.0)
+        if name.startswith("http_request_duration_seconds") and (labels["method"], labels["route"]) == (method, route):
+            totals["server" if name.endswith("_sum") else "requests"] += change
+        elif name == "upstream_request_duration_seconds_sum":
+            totals[labels["service"]] += change
+
+    requests = totals.pop("requests", 0) or 1
+    return {key: value / requests * 1000 for key, value in totals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per endpoint first")
+    parser.add_argument("--retell-latency", type=float, default=0.1)
+    parser.add_argument("--nessie-latency", type=float, default=0.02)
+    parser.add_argument("--transactions", type=int, default=300, help="stub Nessie transactions")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="flag endpoints whose p95 grew by more than this fraction")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        nessie_port, retell_port, port = free_port(), free_port(), free_port()
+        env = {
+            "NESSIE_BASE_URL": f"http://127.0.0.1:{nessie_port}",
+            "RETELL_BASE_URL": f"http://127.0.0.1:{retell_port}",
+            "LEDGER_DB_PATH": os.path.join(tmp, "ledger.db"),
+            "ACCESS_LOG": os.path.join(tmp, "access.log"),
+            # Every request should reach the stubs, so upstream time is always measured
+            "NESSIE_CACHE_MAX_ENTRIES": "0",
+            "RETELL_TOKEN_POOL_AGENTS": "",
+        }
+        processes = [
+            start([sys.executable, "stub_nessie.py", "--port", str(nessie_port),
+                   "--transactions", str(args.transactions), "--latency", str(args.nessie_latency)]),
+            start([sys.executable, "stub_retell.py", "--port", str(retell_port),
+                   "--latency", str(args.retell_latency)]),
+        ]
+        try:
+            wait_until_up(env["NESSIE_BASE_URL"] + "/customers")
+            processes.append(start([sys.executable, "-c", SYNC_SERVER.format(port=port)], env))
+            base_url = f"http://127.0.0.1:{port}"
+            wait_until_up(base_url + "/")
+            httpx.post(base_url + "/api/ledger/sync", json={}, timeout=60).raise_for_status()
+
+            print(f"{args.requests} requests per endpoint, {args.concurrency} concurrent, "
+                  f"retell latency {args.retell_latency}s, nessie latency {args.nessie_latency}s\n")
+            print(f"{'endpoint':<48} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} "
+                  f"{'server ms':>10} {'retell ms':>10} {'nessie ms':>10}")
+
+            results = {}
+            for method, path, body, route in ENDPOINTS:
+                asyncio.run(drive(base_url, method, path, body, args.warmup, args.concurrency))
+                before = scrape(base_url)
+                latencies, errors, _ = asyncio.run(
+                    drive(base_url, method, path, body, args.requests, args.concurrency)
+                )
+                after = scrape(base_url)
+
+                name = f"{method} {path}"
+                breakdown = server_breakdown(before, after, method, route)
+
+                results[name] = {
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                    "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                    "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                    "errors": errors,
+                    "server_ms": round(breakdown.get("server", 0.0), 2),
+                    "retell_ms": round(breakdown.get("retell", 0.0), 2),
+                    "nessie_ms": round(breakdown.get("nessie", 0.0), 2),
+                }
+                r = results[name]
+                print(f"{name[:48]:<48} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                      f"{r['errors']:>7} {r['server_ms']:>10.1f} {r['retell_ms']:>10.1f} {r['nessie_ms']:>10.1f}")
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "endpoints": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["endpoints"]
+        regressions = [
+            (name, baseline[name]["p95_ms"], result["p95_ms"])
+            for name, result in results.items()
+            if name in baseline and result["p95_ms"] > baseline[name]["p95_ms"] * (1 + args.tolerance)
+        ]
+        for name, before, after in regressions:
+            print(f"\nregression: {name} p95 {before:.1f} ms -> {after:.1f} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"\nno endpoint's p95 grew by more than {args.tolerance:.0%} over {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Full refetch from Nessie vs. querying the local ledger replica.
+
+For each transaction count, answers "deposits and withdrawals in the last 30
+days, first page" both ways against a stub Nessie server:
+
+    python benchmarks/ledger_bench.py --sizes 100 1000 10000 50000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from ledger_replica import LedgerReplica  # noqa: E402
+from nessie_gateway import NessieGateway  # noqa: E402
+from stub_nessie import ACCOUNT_ID, StubServer, create_app, seed_store  # noqa: E402
+
+PAGE_SIZE = 50
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--latency", type=float, default=0.05, help="stub Nessie latency per request (s)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    start = (date.today() - timedelta(days=30)).isoformat()
+    types = {"deposit", "withdrawal"}
+
+    print(f"{'transactions':>12} {'refetch ms':>11} {'replica ms':>11} {'speedup':>8} {'initial sync ms':>16}")
+    for size in args.sizes:
+        with StubServer(create_app(seed_store(size), latency=args.latency)) as stub, \
+                tempfile.TemporaryDirectory() as tmp:
+            gateway = NessieGateway(base_url=stub.url)
+            ledger = LedgerReplica(os.path.join(tmp, "ledger.db"), gateway)
+
+            def refetch():
+                activity = gateway.get_account_activity(ACCOUNT_ID)
+                matching = [t for t in activity if t["type"] in types and t["transaction_date"] >= start]
+                return matching[:PAGE_SIZE]
+
+            def replica():
+                return ledger.transactions(account_id=ACCOUNT_ID, start=start, types=sorted(types),
+                                           limit=PAGE_SIZE)["transactions"]
+
+            sync_ms = timed(ledger.sync, 1)
+
+            refetch_ms = timed(refetch, args.repeat)
+            replica_ms = timed(replica, args.repeat)
+            print(f"{size:>12} {refetch_ms:>11.2f} {replica_ms:>11.2f} {refetch_ms / replica_ms:>7.0f}x {sync_ms:>16.1f}")
+            gateway.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Compare the sync Flask server (app.py) with the async ASGI server (asgi_app.py).
+
+Both run against local stub Retell and Nessie servers with added latency, and
+are driven with the same number of concurrent requests per endpoint. Server
+CPU per request is read from /proc where available. The stubs and the client
+run on the same machine, so on few cores they compete with the server for CPU:
+
+    python benchmarks/load_test.py --concurrency 200 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from stub_nessie import ACCOUNT_ID  # noqa: E402
+
+SYNC_SERVER = (
+    "from werkzeug.serving import run_simple; from app import app; "
+    "run_simple('127.0.0.1', {port}, app, threaded=True)"
+)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start(args, env=None):
+    return subprocess.Popen(
+        args, cwd=SERVER_DIR, env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_up(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def cpu_seconds(process):
+    """
+    User + system CPU time a child process has used so far, read from /proc
+    (Linux only - None elsewhere)
+    """
+    try:
+        with open(f"/proc/{process.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def drive(base_url, method, path, body, total, concurrency):
+    """
+    Send `total` requests with at most `concurrency` in flight, returning
+    (latencies in seconds, error count, wall time)
+    """
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    # One single-connection client per worker - a shared httpx pool scans all of
+    # its idle keep-alive connections on every request, which costs more CPU
+    # than the servers being measured once a server keeps connections open
+    limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+    ssl_context = httpx.create_ssl_context()
+    clients = [
+        httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60, verify=ssl_context)
+        for _ in range(concurrency)
+    ]
+
+    async def worker(client):
+        nonlocal errors
+        async with client:
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in clients))
+    return sorted(latencies), errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint per mode")
+    parser.add_argument("--retell-latency", type=float, default=0.1)
+    parser.add_argument("--nessie-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    nessie_port, retell_port = free_port(), free_port()
+    upstream_env = {
+        "NESSIE_BASE_URL": f"http://127.0.0.1:{nessie_port}",
+        "RETELL_BASE_URL": f"http://127.0.0.1:{retell_port}",
+        # Measure the serving model, not the cache or the token pool
+        "NESSIE_CACHE_MAX_ENTRIES": "0",
+        # Activity fans out to three Nessie endpoints per request
+        "NESSIE_POOL_SIZE": str(3 * args.concurrency),
+        "RETELL_POOL_SIZE": str(args.concurrency),
+        "RETELL_TOKEN_POOL_AGENTS": "",
+    }
+    processes = [
+        start([sys.executable, "stub_nessie.py", "--port", str(nessie_port), "--latency", str(args.nessie_latency)]),
+        start([sys.executable, "stub_retell.py", "--port", str(retell_port), "--latency", str(args.retell_latency)]),
+    ]
+
+    sync_port, async_port = free_port(), free_port()
+    modes = {
+        "sync (flask)": (sync_port, [sys.executable, "-c", SYNC_SERVER.format(port=sync_port)]),
+        "async (asgi)": (async_port, [sys.executable, "-m", "uvicorn", "asgi_app:app",
+                                      "--port", str(async_port), "--log-level", "warning"]),
+    }
+    endpoints = [
+        ("POST", "/api/generate-token", {"agent_id": "agent_load_test"}),
+        ("GET", f"/api/accounts/{ACCOUNT_ID}/activity", None),
+    ]
+
+    try:
+        wait_until_up(upstream_env["NESSIE_BASE_URL"] + "/customers")
+        print(f"{args.requests} requests per endpoint, {args.concurrency} concurrent, "
+              f"retell latency {args.retell_latency}s, nessie latency {args.nessie_latency}s\n")
+        print(f"{'mode':<14} {'endpoint':<40} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'cpu ms/req':>11}")
+
+        for mode, (port, command) in modes.items():
+            server = start(command, upstream_env)
+            processes.append(server)
+            base_url = f"http://127.0.0.1:{port}"
+            wait_until_up(base_url + "/")
+
+            for method, path, body in endpoints:
+                cpu_before = cpu_seconds(server)
+                latencies, errors, wall = asyncio.run(
+                    drive(base_url, method, path, body, args.requests, args.concurrency)
+                )
+                cpu_after = cpu_seconds(server)
+                cpu = "n/a" if cpu_before is None else f"{(cpu_after - cpu_before) / len(latencies) * 1000:.1f}"
+                print(f"{mode:<14} {method + ' ' + path[:34]:<40} {len(latencies) / wall:>8.1f} "
+                      f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 95) * 1000:>8.1f} "
+                      f"{percentile(latencies, 99) * 1000:>8.1f} {errors:>7} {cpu:>11}")
+
+            server.terminate()
+            server.wait()
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Nearest-k lookups on the spatial index vs. a brute-force NumPy haversine scan,
+over synthetic ATMs/branches spread across the continental US:
+
+    python benchmarks/locations_bench.py --locations 100000 --queries 2000
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from location_service import SpatialIndex, haversine_miles  # noqa: E402
+
+# Rough population centres so the data is clustered like real ATM networks
+CITIES = [(38.9, -77.03), (40.71, -74.0), (41.88, -87.63), (29.76, -95.37), (34.05, -118.24),
+          (33.75, -84.39), (39.95, -75.17), (47.61, -122.33), (25.76, -80.19), (39.74, -104.99)]
+
+
+def synthetic_locations(count, seed=0):
+    random.seed(seed)
+    locations = []
+    for i in range(count):
+        if random.random() < 0.8:
+            lat, lng = random.choice(CITIES)
+            lat, lng = lat + random.gauss(0, 0.3), lng + random.gauss(0, 0.3)
+        else:
+            lat, lng = random.uniform(25, 49), random.uniform(-124, -67)
+        locations.append({
+            "_id": str(i),
+            "kind": "atm" if random.random() < 0.8 else "branch",
+            "name": f"Location {i}",
+            "geocode": {"lat": lat, "lng": lng},
+            "accessibility": random.random() < 0.6,
+            "language_list": random.sample(["English", "Spanish", "French", "Chinese"], 2),
+            "hours": [random.choice(["24/7", "6:00-22:00", "Mon-Fri: 9:00-17:00"])],
+        })
+    # A few ATMs with a language nothing else offers, all in Seattle, so a
+    # filter on it has to look across the whole country
+    for i in range(3):
+        locations.append({
+            "_id": f"rare-{i}",
+            "kind": "atm",
+            "name": f"Rare {i}",
+            "geocode": {"lat": 47.61 + i * 0.01, "lng": -122.33},
+            "accessibility": False,
+            "language_list": ["Tagalog"],
+            "hours": ["24/7"],
+        })
+    return locations
+
+
+def brute_force(index, lat, lng, k, **filters):
+    candidates = np.flatnonzero(index._matches(np.arange(len(index)), **filters))
+    distances = haversine_miles(math.radians(lat), math.radians(lng), index.lat[candidates], index.lng[candidates])
+    if len(distances) > k:
+        top = np.argpartition(distances, k - 1)[:k]
+    else:
+        top = np.arange(len(distances))
+    return candidates[top[np.argsort(distances[top])]], np.sort(distances[top])
+
+
+def per_query_us(fn, queries):
+    started = time.perf_counter()
+    for lat, lng in queries:
+        fn(lat, lng)
+    return (time.perf_counter() - started) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--locations", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    locations = synthetic_locations(args.locations)
+    started = time.perf_counter()
+    index = SpatialIndex(locations)
+    print(f"built index over {len(index)} locations in {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"({len(index.cells)} grid cells)\n")
+
+    random.seed(1)
+    queries = [(lat + random.gauss(0, 0.5), lng + random.gauss(0, 0.5))
+               for lat, lng in (random.choice(CITIES) for _ in range(args.queries))]
+
+    # Far from every location (a "no geolocation" default), a filter only three
+    # locations pass, and a filter nothing passes
+    far_away = {"lat": 0.0, "lng": 0.0}
+    rare = {"language": "Tagalog"}
+    no_match = {"language": "Tagalog", "kind": "branch"}
+
+    # Check the index returns exactly what a full scan does
+    checks = [(lat, lng, {}) for lat, lng in queries[:200]]
+    checks += [(far_away["lat"], far_away["lng"], {})] + [(lat, lng, f) for lat, lng in queries[:20] for f in (rare, no_match)]
+    for lat, lng, filters in checks:
+        expected = brute_force(index, lat, lng, args.k, **filters)[1]
+        found = [loc["distance_miles"] for loc in index.nearest(lat, lng, k=args.k, **filters)]
+        assert len(found) == len(expected) and np.allclose(found, expected, atol=1e-3), (lat, lng, found, expected)
+
+    cases = [
+        ("brute force scan", lambda lat, lng: brute_force(index, lat, lng, args.k)),
+        ("index nearest-k", lambda lat, lng: index.nearest(lat, lng, k=args.k)),
+        ("index within 5 mi", lambda lat, lng: index.nearest(lat, lng, k=args.k, radius=5)),
+        ("index filtered", lambda lat, lng: index.nearest(lat, lng, k=args.k, kind="atm", accessible=True,
+                                                          language="Spanish", open_at=(2, 20 * 60))),
+        ("index far away", lambda lat, lng: index.nearest(far_away["lat"], far_away["lng"], k=args.k)),
+        ("index rare filter", lambda lat, lng: index.nearest(lat, lng, k=args.k, **rare)),
+        ("index no match", lambda lat, lng: index.nearest(lat, lng, k=args.k, **no_match)),
+    ]
+    print(f"{'query':<20} {'us/query':>10}")
+    for name, fn in cases:
+        print(f"{name:<20} {per_query_us(fn, queries):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
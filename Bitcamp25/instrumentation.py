@@ -0,0 +1,373 @@
+"""
+Request timing, upstream spans and an on-demand sampling profiler for app.py.
+
+Every request is timed into a per-route histogram and written to a JSON
+access log, together with the spans of the Retell and Nessie calls it made.
+Everything is exposed in Prometheus text format by render_metrics().
+"""
+import collections
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+# "stdout" (default), "off", or a file path to append JSON lines to
+ACCESS_LOG = os.environ.get("ACCESS_LOG", "stdout")
+
+# Requests carrying PROFILE_HEADER are profiled only when PROFILING_ENABLED is set,
+# so the header can't be used to slow down a production server
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+PROFILE_HEADER = os.environ.get("PROFILE_HEADER", "X-Profile")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+# Upper bounds in seconds, Prometheus-style
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Path segments with a digit in them are ids (Nessie uses 24-character hex ids)
+ID_SEGMENT = re.compile(r"/[^/]*\d[^/]*(?=/|$)")
+
+# Incoming X-Request-Id values are only kept if they look like this - anything
+# else is replaced, so it can't be used to inject into logs or headers
+REQUEST_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# Spans of the request being handled - copied into worker threads with contextvars.copy_context()
+_current_spans = contextvars.ContextVar("current_spans", default=None)
+
+
+class Histogram:
+    """
+    Thread-safe labelled histogram with cumulative buckets
+    """
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                label_text = format_labels(self.label_names, labels)
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {series['sum']}")
+                lines.append(f"{self.name}_count{{{label_text}}} {series['count']}")
+        return lines
+
+
+class Counter:
+    """
+    Thread-safe labelled counter
+    """
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = collections.Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{{{format_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+def format_labels(names, values):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to handle a request, until its body was fully sent",
+    ("method", "route", "status"),
+)
+RESPONSE_BYTES = Counter("http_response_bytes_total", "Response body bytes sent", ("method", "route"))
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Time spent in calls to Retell and Nessie",
+    ("service", "operation", "status"),
+)
+UPSTREAM_BYTES = Counter(
+    "upstream_response_bytes_total", "Response body bytes received from Retell and Nessie",
+    ("service", "operation"),
+)
+METRICS = [REQUEST_DURATION, RESPONSE_BYTES, UPSTREAM_DURATION, UPSTREAM_BYTES]
+
+
+def render_metrics():
+    """
+    Every metric in Prometheus text exposition format
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def operation_name(method, endpoint):
+    """
+    "GET /accounts/{id}/deposits" - ids are folded so every account shares one series
+    """
+    return f"{method} {ID_SEGMENT.sub('/{id}', endpoint)}"
+
+
+@contextlib.contextmanager
+def upstream_span(service, operation):
+    """
+    Time one upstream call. The caller fills in span["status"] and span["bytes"]
+    (None if unknown); an exception's status_code (or "error") is used if it raises first.
+    """
+    span = {"service": service, "operation": operation, "status": None, "bytes": 0}
+    started = time.perf_counter()
+    try:
+        yield span
+    except Exception as e:
+        span["status"] = span["status"] or getattr(e, "status_code", None) or "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_DURATION.observe((service, operation, str(span["status"])), elapsed)
+        if span["bytes"] is not None:
+            UPSTREAM_BYTES.inc((service, operation), span["bytes"])
+
+        spans = _current_spans.get()
+        if spans is not None:
+            spans.append({**span, "duration_ms": round(elapsed * 1000, 2)})
+
+
+def create_web_call(client, **kwargs):
+    """
+    client.call.create_web_call(...) with an upstream span around it. Clients
+    without the SDK's with_raw_response (e.g. test fakes) are called directly,
+    with the status recorded as "ok" and the size as unknown.
+    """
+    with upstream_span("retell", "create_web_call") as span:
+        raw_calls = getattr(client.call, "with_raw_response", None)
+        if raw_calls is None:
+            response = client.call.create_web_call(**kwargs)
+            span["status"], span["bytes"] = "ok", None
+            return response
+        raw = raw_calls.create_web_call(**kwargs)
+        span["status"], span["bytes"] = raw.status_code, len(raw.http_response.content)
+        return raw.parse()
+
+
+async def create_web_call_async(client, **kwargs):
+    """
+    create_web_call for an AsyncRetell client
+    """
+    with upstream_span("retell", "create_web_call") as span:
+        raw_calls = getattr(client.call, "with_raw_response", None)
+        if raw_calls is None:
+            response = await client.call.create_web_call(**kwargs)
+            span["status"], span["bytes"] = "ok", None
+            return response
+        raw = await raw_calls.create_web_call(**kwargs)
+        span["status"], span["bytes"] = raw.status_code, len(raw.http_response.content)
+        return await raw.parse()
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a
+    background thread. Stacks are counted in the folded format flamegraph
+    tools read ("module:function;module:function count").
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def access_logger(target=ACCESS_LOG):
+    logger = logging.getLogger("access")
+    logger.propagate = False
+    if target != "off" and not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout) if target == "stdout" else logging.FileHandler(target)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    return logger
+
+
+class InstrumentationMiddleware:
+    """
+    WSGI middleware timing each request until its body has been fully sent,
+    so streamed responses count their whole stream.
+
+    The route template is read from environ["instrumentation.route"], which
+    instrument() fills in for Flask - unmatched paths are grouped as "unmatched".
+    """
+
+    def __init__(self, wsgi_app, logger=None, profiling=PROFILING_ENABLED):
+        self.wsgi_app = wsgi_app
+        self.logger = logger or access_logger()
+        self.profiling = profiling
+        self.profile_environ_key = "HTTP_" + PROFILE_HEADER.upper().replace("-", "_")
+
+    def __call__(self, environ, start_response):
+        request_id = environ.get("HTTP_X_REQUEST_ID", "")
+        if not REQUEST_ID.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        record = {
+            "request_id": request_id,
+            "method": environ.get("REQUEST_METHOD"),
+            "path": environ.get("PATH_INFO"),
+            "status": None,
+            "bytes": 0,
+            "spans": [],
+            "started": time.perf_counter(),
+            "profiler": None,
+        }
+        if self.profiling and environ.get(self.profile_environ_key):
+            record["profiler"] = SamplingProfiler(threading.get_ident()).start()
+
+        def instrumented_start_response(status, headers, exc_info=None):
+            record["status"] = int(status.split(" ", 1)[0])
+            return start_response(status, headers + [("X-Request-Id", request_id)], exc_info)
+
+        # Reset in _finish, once the body has been sent - streamed bodies make upstream calls too
+        record["token"] = _current_spans.set(record["spans"])
+        try:
+            body = self.wsgi_app(environ, instrumented_start_response)
+        except Exception:
+            record["status"] = 500
+            self._finish(environ, record)
+            raise
+        return _InstrumentedBody(body, self, environ, record)
+
+    def _finish(self, environ, record):
+        elapsed = time.perf_counter() - record["started"]
+        _current_spans.reset(record["token"])
+        route = environ.get("instrumentation.route", "unmatched")
+        REQUEST_DURATION.observe((record["method"], route, str(record["status"])), elapsed)
+        RESPONSE_BYTES.inc((record["method"], route), record["bytes"])
+
+        entry = {
+            "ts": round(time.time(), 3),
+            "request_id": record["request_id"],
+            "method": record["method"],
+            "path": record["path"],
+            "route": route,
+            "status": record["status"],
+            "duration_ms": round(elapsed * 1000, 2),
+            "bytes": record["bytes"],
+            "remote_addr": environ.get("REMOTE_ADDR"),
+            "spans": record["spans"],
+            "upstream_ms": round(sum(span["duration_ms"] for span in record["spans"]), 2),
+        }
+
+        profiler = record["profiler"]
+        if profiler is not None:
+            profiler.stop()
+            # Named by the server, never by anything the client sent
+            path = os.path.join(PROFILE_DIR, f"{uuid.uuid4().hex}.folded")
+            try:
+                profiler.save(path)
+                entry["profile"] = {"path": path, "samples": profiler.samples}
+            except OSError as e:
+                print(f"Error saving request profile: {str(e)}")
+
+        if self.logger.handlers:
+            self.logger.info(json.dumps(entry))
+
+
+class _InstrumentedBody:
+    """
+    Response iterable that counts bytes and finishes the request record on close
+    """
+
+    def __init__(self, body, middleware, environ, record):
+        self.body = body
+        self.middleware = middleware
+        self.environ = environ
+        self.record = record
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.record["bytes"] += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self.middleware._finish(self.environ, self.record)
+
+
+def instrument(app):
+    """
+    Time every request to a Flask app and tag it with its route template
+    """
+    from flask import request
+
+    @app.before_request
+    def tag_route():
+        if request.url_rule is not None:
+            request.environ["instrumentation.route"] = request.url_rule.rule
+
+    app.wsgi_app = InstrumentationMiddleware(app.wsgi_app)
+    return app
@@ -0,0 +1,357 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from nessie_gateway import NessieError, NessieGateway, transaction_date
+
+LEDGER_DB_PATH = os.environ.get("LEDGER_DB_PATH", "ledger.db")
+# Seconds between background syncs - 0 means only sync when asked to
+LEDGER_SYNC_INTERVAL = float(os.environ.get("LEDGER_SYNC_INTERVAL", "0"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    hash TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS accounts (
+    id TEXT PRIMARY KEY,
+    customer_id TEXT,
+    type TEXT,
+    balance REAL,
+    data TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    -- Bumped whenever a sync changes the account or its transactions
+    version INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL
+);
+
+-- A transfer shows up under both the payer and the payee account
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT NOT NULL,
+    account_id TEXT NOT NULL,
+    customer_id TEXT,
+    type TEXT NOT NULL,
+    date TEXT NOT NULL,
+    amount REAL,
+    description TEXT,
+    payer_id TEXT,
+    data TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (id, account_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_accounts_customer ON accounts (customer_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_account_date ON transactions (account_id, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_customer ON transactions (customer_id, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions (type, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_account_type_date ON transactions (account_id, type, date, id);
+"""
+
+
+def record_hash(record):
+    return hashlib.sha1(json.dumps(record, sort_keys=True).encode()).hexdigest()
+
+
+class LedgerReplica:
+    """
+    Local SQLite copy of Nessie customers, accounts and transactions.
+
+    `sync` pulls from Nessie and only writes rows that are new or whose
+    content changed since the last sync (Nessie has no change feed, so rows
+    are compared by hash). Queries are answered from the indexed tables.
+    """
+
+    def __init__(self, db_path=LEDGER_DB_PATH, gateway=None):
+        self.db_path = db_path
+        # Sync uses its own uncached gateway so it always sees fresh data
+        self.gateway = gateway or NessieGateway()
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        # Called with (account_id, version) after a sync changes an account
+        self.listeners = []
+
+        with self._connection() as db:
+            db.executescript(SCHEMA)
+            # Replicas created before payer_id was its own column
+            columns = [row["name"] for row in db.execute("PRAGMA table_info(transactions)")]
+            if "payer_id" not in columns:
+                db.execute("ALTER TABLE transactions ADD COLUMN payer_id TEXT")
+                db.execute("UPDATE transactions SET payer_id = json_extract(data, '$.payer_id')")
+
+    def _connection(self):
+        """
+        One connection per thread - sqlite3 connections can't be shared across threads
+        """
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path)
+            db.row_factory = sqlite3.Row
+            if self.db_path != ":memory:":
+                db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def sync(self, customer_ids=None):
+        """
+        Pull the given customers (all of them by default) with their accounts
+        and transactions, applying only what changed. Customers and accounts
+        that no longer exist in Nessie are deleted with their transactions.
+        Returns row counts.
+        """
+        with self._sync_lock:
+            counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "accounts_changed": 0}
+            db = self._connection()
+
+            if customer_ids is not None:
+                customers, gone = [], []
+                for customer_id in customer_ids:
+                    try:
+                        customers.append(self.gateway.get(f"/customers/{customer_id}"))
+                    except NessieError as e:
+                        if e.status_code != 404:
+                            raise
+                        gone.append(customer_id)
+            else:
+                customers = self.gateway.get_list("/customers")
+                fetched = {customer["_id"] for customer in customers}
+                gone = [row["id"] for row in db.execute("SELECT id FROM customers") if row["id"] not in fetched]
+
+            for customer_id in gone:
+                with db:
+                    self._delete_accounts(db, self._account_ids(db, customer_id), counts)
+                    counts["deleted"] += db.execute("DELETE FROM customers WHERE id = ?", (customer_id,)).rowcount
+
+            for customer in customers:
+                with db:
+                    self._upsert(db, "customers", {"id": customer["_id"]}, customer, counts)
+
+                accounts = self.gateway.get_list(f"/customers/{customer['_id']}/accounts")
+                for account in accounts:
+                    activity = self.gateway.get_account_activity(account["_id"])
+                    with db:
+                        changed = self._sync_account(db, customer["_id"], account, activity, counts)
+                    if changed:
+                        self._notify(account["_id"])
+
+                fetched = {account["_id"] for account in accounts}
+                with db:
+                    self._delete_accounts(
+                        db, [i for i in self._account_ids(db, customer["_id"]) if i not in fetched], counts
+                    )
+            return counts
+
+    def _account_ids(self, db, customer_id):
+        return [row["id"] for row in db.execute("SELECT id FROM accounts WHERE customer_id = ?", (customer_id,))]
+
+    def _delete_accounts(self, db, account_ids, counts):
+        """
+        Delete accounts that no longer exist upstream, with their transactions
+        """
+        for account_id in account_ids:
+            counts["deleted"] += db.execute("DELETE FROM transactions WHERE account_id = ?", (account_id,)).rowcount
+            counts["deleted"] += db.execute("DELETE FROM accounts WHERE id = ?", (account_id,)).rowcount
+            counts["accounts_changed"] += 1
+
+    def _notify(self, account_id):
+        version = self.account_version(account_id)
+        for listener in self.listeners:
+            try:
+                listener(account_id, version)
+            except Exception as e:
+                print(f"Error in ledger sync listener: {str(e)}")
+
+    def _sync_account(self, db, customer_id, account, activity, counts):
+        before = counts["inserted"] + counts["updated"] + counts["deleted"]
+
+        self._upsert(db, "accounts", {
+            "id": account["_id"],
+            "customer_id": customer_id,
+            "type": account.get("type"),
+            "balance": account.get("balance"),
+        }, account, counts)
+
+        existing = {
+            row["id"]: row["hash"]
+            for row in db.execute("SELECT id, hash FROM transactions WHERE account_id = ?", (account["_id"],))
+        }
+        for transaction in activity:
+            digest = record_hash(transaction)
+            previous = existing.pop(transaction["_id"], None)
+            if previous == digest:
+                counts["unchanged"] += 1
+                continue
+            db.execute(
+                "INSERT OR REPLACE INTO transactions "
+                "(id, account_id, customer_id, type, date, amount, description, payer_id, data, hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (transaction["_id"], account["_id"], customer_id, transaction["type"],
+                 transaction_date(transaction)[:10], transaction.get("amount"),
+                 transaction.get("description"), transaction.get("payer_id"),
+                 json.dumps(transaction), digest),
+            )
+            counts["inserted" if previous is None else "updated"] += 1
+
+        # Whatever is left no longer exists upstream
+        db.executemany(
+            "DELETE FROM transactions WHERE id = ? AND account_id = ?",
+            [(transaction_id, account["_id"]) for transaction_id in existing],
+        )
+        counts["deleted"] += len(existing)
+
+        changed = counts["inserted"] + counts["updated"] + counts["deleted"] > before
+        db.execute(
+            "UPDATE accounts SET synced_at = ?, version = version + ? WHERE id = ?",
+            (time.time(), 1 if changed else 0, account["_id"]),
+        )
+        counts["accounts_changed"] += changed
+        return changed
+
+    def _upsert(self, db, table, columns, record, counts):
+        digest = record_hash(record)
+        row = db.execute(f"SELECT hash FROM {table} WHERE id = ?", (columns["id"],)).fetchone()
+        if row is not None and row["hash"] == digest:
+            counts["unchanged"] += 1
+            return
+
+        values = {**columns, "data": json.dumps(record), "hash": digest}
+        if row is None:
+            db.execute(
+                f"INSERT INTO {table} ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                list(values.values()),
+            )
+            counts["inserted"] += 1
+        else:
+            db.execute(
+                f"UPDATE {table} SET {', '.join(f'{name} = ?' for name in values)} WHERE id = ?",
+                [*values.values(), columns["id"]],
+            )
+            counts["updated"] += 1
+
+    def transactions(self, account_id=None, customer_id=None, start=None, end=None,
+                     types=None, limit=100, offset=0):
+        """
+        One page of transactions, newest first. `start`/`end` are inclusive
+        YYYY-MM-DD dates and `types` any of deposit/withdrawal/transfer.
+        """
+        clauses, params = [], []
+        if account_id:
+            clauses.append("account_id = ?")
+            params.append(account_id)
+        if customer_id:
+            clauses.append("customer_id = ?")
+            params.append(customer_id)
+        if start:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("date <= ?")
+            params.append(end)
+        if types:
+            clauses.append(f"type IN ({', '.join('?' * len(types))})")
+            params.extend(types)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # A transfer between two accounts in the result is stored once per account -
+        # only list it once unless the query is scoped to a single account
+        group = "" if account_id else "GROUP BY id"
+        # Fetch one extra row to know whether there is another page
+        rows = self._connection().execute(
+            f"SELECT data FROM transactions {where} {group} ORDER BY date DESC, id LIMIT ? OFFSET ?",
+            [*params, limit + 1, offset],
+        ).fetchall()
+
+        return {
+            "transactions": [json.loads(row["data"]) for row in rows[:limit]],
+            "limit": limit,
+            "offset": offset,
+            "next_offset": offset + limit if len(rows) > limit else None,
+        }
+
+    def iter_transactions(self, account_id, kind, page_size=1000):
+        """
+        Yield an account's transactions of one type, newest first, as plain tuples of
+        (id, type, date, amount, description, payer_id, payee_id, status, medium).
+        Pages with keyset pagination so memory stays flat however long the history is.
+        """
+        cursor = self._connection().cursor()
+        cursor.row_factory = None
+        query = (
+            "SELECT id, type, date, amount, description, payer_id, json_extract(data, '$.payee_id'), "
+            "json_extract(data, '$.status'), json_extract(data, '$.medium') "
+            "FROM transactions WHERE account_id = ? AND type = ? {after} "
+            "ORDER BY date DESC, id DESC LIMIT ?"
+        )
+
+        rows = cursor.execute(query.format(after=""), (account_id, kind, page_size)).fetchall()
+        while rows:
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_id, last_date = rows[-1][0], rows[-1][2]
+            rows = cursor.execute(
+                query.format(after="AND (date < ? OR (date = ? AND id < ?))"),
+                (account_id, kind, last_date, last_date, last_id, page_size),
+            ).fetchall()
+
+    def accounts(self, customer_id):
+        rows = self._connection().execute(
+            "SELECT data FROM accounts WHERE customer_id = ? ORDER BY id", (customer_id,)
+        ).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def account_versions(self):
+        """
+        Current data version of every account, bumped by each sync that changed it
+        """
+        rows = self._connection().execute("SELECT id, version, synced_at FROM accounts").fetchall()
+        return {row["id"]: {"version": row["version"], "synced_at": row["synced_at"]} for row in rows}
+
+    def account_version(self, account_id):
+        row = self._connection().execute("SELECT version FROM accounts WHERE id = ?", (account_id,)).fetchone()
+        return row["version"] if row else None
+
+    def account_columns(self, account_id):
+        """
+        Raw rows for columnar analysis as plain tuples of
+        (date, type, amount, description, account is the payer), plus the account's current balance
+        """
+        db = self._connection()
+        account = db.execute("SELECT balance FROM accounts WHERE id = ?", (account_id,)).fetchone()
+        cursor = db.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute(
+            "SELECT date, type, amount, description, payer_id = account_id "
+            "FROM transactions WHERE account_id = ? ORDER BY date",
+            (account_id,),
+        ).fetchall()
+        return rows, account["balance"] if account else None
+
+    def start(self, interval=LEDGER_SYNC_INTERVAL):
+        """
+        Keep the replica in sync on a background thread. Safe to call on every
+        request - only the first call starts the thread.
+        """
+        if interval <= 0:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"Error syncing ledger replica: {str(e)}")
+                time.sleep(interval)
+
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=loop, name="ledger-sync", daemon=True)
+        self._thread.start()
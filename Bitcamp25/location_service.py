@@ -0,0 +1,333 @@
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_MILES / 360
+
+# Seconds between location snapshots - ATMs and branches rarely change
+LOCATION_REFRESH_INTERVAL = float(os.environ.get("LOCATION_REFRESH_INTERVAL", "3600"))
+
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+SLOT_MINUTES = 30  # opening hours are tracked in half-hour slots, 48 per day
+ALL_DAY = (1 << (24 * 60 // SLOT_MINUTES)) - 1
+
+DAY_RANGE = re.compile(r"\b(mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?(?:\s*(?:-|to)\s*(mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?)?")
+TIME_RANGE = re.compile(
+    r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\s*(?:-|to)\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm)?"
+)
+
+
+def haversine_miles(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distance in miles; arguments in radians, arrays welcome
+    """
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def to_minutes(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem == "pm" and hour != 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    return hour * 60 + minute
+
+
+def slot_bits(start, end):
+    """
+    Bitmask of the half-hour slots between two times of day (minutes), wrapping past midnight
+    """
+    first, last = start // SLOT_MINUTES, math.ceil(end / SLOT_MINUTES)
+    if last <= first:
+        return ALL_DAY & ~((1 << first) - 1) | ((1 << last) - 1)
+    return ((1 << last) - 1) & ~((1 << first) - 1)
+
+
+def parse_hours(hours):
+    """
+    Parse Nessie opening hours ("24/7", "9:00-17:00", "Mon-Fri: 9am-5pm", ...)
+    into 7 per-day slot bitmasks, Monday first. Returns None if nothing parses.
+    """
+    week = [0] * 7
+    parsed = False
+    for entry in hours or []:
+        text = entry.lower()
+        if "24/7" in text or "24 hours" in text:
+            return [ALL_DAY] * 7
+
+        times = TIME_RANGE.search(text)
+        if not times:
+            continue
+        start_h, start_m, start_ampm, end_h, end_m, end_ampm = times.groups()
+        # "9-5pm" style ranges share the second meridiem
+        bits = slot_bits(to_minutes(start_h, start_m, start_ampm or (end_ampm if end_ampm == "am" else None)),
+                         to_minutes(end_h, end_m, end_ampm))
+
+        days = DAY_RANGE.search(text[:times.start()])
+        if days:
+            first = DAYS.index(days.group(1))
+            last = DAYS.index(days.group(2)) if days.group(2) else first
+            selected = [(first + i) % 7 for i in range((last - first) % 7 + 1)]
+        else:
+            selected = range(7)
+        for day in selected:
+            week[day] |= bits
+        parsed = True
+    return week if parsed else None
+
+
+class SpatialIndex:
+    """
+    Uniform lat/lng grid over a snapshot of locations for nearest-k lookups.
+
+    Queries scan grid rings outward from the query's cell and stop as soon as
+    no unvisited cell can hold anything closer than the k-th match found. If
+    that takes more than `max_rings` rings, or a quarter of all locations have
+    been looked at, the query falls back to a full vectorized scan.
+    Filters are precomputed as arrays so they only cost a lookup per candidate.
+    """
+
+    def __init__(self, locations, cell_degrees=0.1, max_rings=20):
+        self.locations = locations
+        self.cell_degrees = cell_degrees
+        self.max_rings = max_rings
+
+        lat = np.array([loc["geocode"]["lat"] for loc in locations], dtype=np.float64)
+        lng = np.array([loc["geocode"]["lng"] for loc in locations], dtype=np.float64)
+        self.lat, self.lng = np.radians(lat), np.radians(lng)
+
+        self.is_atm = np.array([loc["kind"] == "atm" for loc in locations], dtype=bool)
+        self.accessible = np.array([bool(loc.get("accessibility")) for loc in locations], dtype=bool)
+
+        self.languages = {}
+        language_bits = np.zeros(len(locations), dtype=np.uint64)
+        for i, loc in enumerate(locations):
+            for language in loc.get("language_list") or []:
+                bit = self.languages.setdefault(language.lower(), len(self.languages))
+                if bit < 64:
+                    language_bits[i] |= np.uint64(1 << bit)
+        self.language_bits = language_bits
+
+        hours = [parse_hours(loc.get("hours")) for loc in locations]
+        self.has_hours = np.array([h is not None for h in hours], dtype=bool)
+        self.open_slots = np.array([h or [0] * 7 for h in hours], dtype=np.uint64).reshape(len(locations), 7)
+
+        # Bucket location indices by grid cell
+        rows = np.floor(lat / cell_degrees).astype(np.int64)
+        cols = np.floor(lng / cell_degrees).astype(np.int64)
+        self.cells = {}
+        if len(locations):
+            order = np.lexsort((cols, rows))
+            keys = np.stack((rows[order], cols[order]), axis=1)
+            boundaries = np.flatnonzero(np.any(np.diff(keys, axis=0), axis=1)) + 1
+            for chunk in np.split(order, boundaries):
+                self.cells[(int(rows[chunk[0]]), int(cols[chunk[0]]))] = chunk
+            self.row_range = (int(rows.min()), int(rows.max()))
+            self.col_range = (int(cols.min()), int(cols.max()))
+
+    def __len__(self):
+        return len(self.locations)
+
+    def _ring(self, row, col, r):
+        if r == 0:
+            cell = self.cells.get((row, col))
+            return [cell] if cell is not None else []
+        found = []
+        for dc in range(-r, r + 1):
+            for dr in (-r, r):
+                cell = self.cells.get((row + dr, col + dc))
+                if cell is not None:
+                    found.append(cell)
+        for dr in range(-r + 1, r):
+            for dc in (-r, r):
+                cell = self.cells.get((row + dr, col + dc))
+                if cell is not None:
+                    found.append(cell)
+        return found
+
+    def _matches(self, indices, kind=None, accessible=None, language=None, open_at=None):
+        keep = np.ones(len(indices), dtype=bool)
+        if kind:
+            keep &= self.is_atm[indices] == (kind == "atm")
+        if accessible is not None:
+            keep &= self.accessible[indices] == accessible
+        if language:
+            bit = self.languages.get(language.lower())
+            if bit is None or bit >= 64:
+                return keep & False
+            keep &= (self.language_bits[indices] >> np.uint64(bit)) & np.uint64(1) == 1
+        if open_at:
+            day, minute = open_at
+            slot = np.uint64(minute // SLOT_MINUTES)
+            keep &= self.has_hours[indices] & ((self.open_slots[indices, day] >> slot) & np.uint64(1) == 1)
+        return keep
+
+    def nearest(self, lat, lng, k=5, radius=None, **filters):
+        """
+        The k nearest locations (closest first) within `radius` miles that pass the
+        filters: kind ("atm"/"branch"), accessible (bool), language, open_at ((weekday, minute))
+        """
+        if not len(self):
+            return []
+
+        qlat, qlng = math.radians(lat), math.radians(lng)
+        row, col = math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+        # Rings beyond this cover no cells at all
+        max_ring = max(abs(row - self.row_range[0]), abs(row - self.row_range[1]),
+                       abs(col - self.col_range[0]), abs(col - self.col_range[1]))
+        # Rings before this are empty - a query this far outside the grid goes straight to a scan
+        min_ring = max(self.row_range[0] - row, row - self.row_range[1],
+                       self.col_range[0] - col, col - self.col_range[1], 0)
+        if min_ring > self.max_rings:
+            return self._scan(qlat, qlng, k, radius, **filters)
+
+        best_idx, best_dist = np.empty(0, dtype=np.int64), np.empty(0)
+        scanned = 0
+        for r in range(max_ring + 1):
+            # Few or no matches nearby (a far-off query, a rare filter) would walk
+            # every ring - past a point one vectorized pass over everything is cheaper
+            if r > self.max_rings or scanned > len(self) // 4:
+                return self._scan(qlat, qlng, k, radius, **filters)
+
+            cells = self._ring(row, col, r)
+            if cells:
+                indices = np.concatenate(cells)
+                scanned += len(indices)
+                indices = indices[self._matches(indices, **filters)]
+                distances = haversine_miles(qlat, qlng, self.lat[indices], self.lng[indices])
+                if radius is not None:
+                    indices, distances = indices[distances <= radius], distances[distances <= radius]
+                best_idx = np.concatenate((best_idx, indices))
+                best_dist = np.concatenate((best_dist, distances))
+                if len(best_idx) > k:
+                    keep = np.argpartition(best_dist, k - 1)[:k]
+                    best_idx, best_dist = best_idx[keep], best_dist[keep]
+
+            # Everything not yet visited is at least r whole cells away
+            widest_lat = min(abs(lat) + (r + 1) * self.cell_degrees, 89.9)
+            cell_miles = self.cell_degrees * MILES_PER_DEGREE * math.cos(math.radians(widest_lat))
+            bound = r * cell_miles
+            if radius is not None and bound > radius:
+                break
+            if len(best_idx) == k and best_dist.max() <= bound:
+                break
+
+        return self._results(best_idx, best_dist)
+
+    def _scan(self, qlat, qlng, k, radius=None, **filters):
+        """
+        Brute-force nearest-k over every location
+        """
+        if any(value is not None for value in filters.values()):
+            indices = np.flatnonzero(self._matches(np.arange(len(self)), **filters))
+            distances = haversine_miles(qlat, qlng, self.lat[indices], self.lng[indices])
+        else:
+            indices = np.arange(len(self))
+            distances = haversine_miles(qlat, qlng, self.lat, self.lng)
+        if radius is not None:
+            indices, distances = indices[distances <= radius], distances[distances <= radius]
+        if len(indices) > k:
+            keep = np.argpartition(distances, k - 1)[:k]
+            indices, distances = indices[keep], distances[keep]
+        return self._results(indices, distances)
+
+    def _results(self, indices, distances):
+        order = np.argsort(distances)
+        return [
+            {**self.locations[i], "distance_miles": round(float(d), 3)}
+            for i, d in zip(indices[order], distances[order])
+        ]
+
+
+class LocationService:
+    """
+    Periodically snapshots every Nessie ATM and branch into a SpatialIndex
+    so proximity lookups are answered locally
+    """
+
+    def __init__(self, gateway, refresh_interval=LOCATION_REFRESH_INTERVAL):
+        self.gateway = gateway
+        self.refresh_interval = refresh_interval
+        self.index = None
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    def fetch_atms(self):
+        """
+        All ATMs, following Nessie's paging links
+        """
+        atms, endpoint, params = [], "/atms", None
+        while endpoint:
+            page = self.gateway.get(endpoint, params=params)
+            if isinstance(page, list):
+                return atms + page
+            atms.extend(page.get("data") or [])
+
+            next_page = (page.get("paging") or {}).get("next")
+            if not next_page:
+                break
+            endpoint, _, query = next_page.partition("?")
+            params = {key: value for key, value in parse_qsl(query) if key != "key"}
+        return atms
+
+    def refresh(self):
+        atms = [{**atm, "kind": "atm"} for atm in self.fetch_atms()]
+        branches = [{**branch, "kind": "branch"} for branch in self.gateway.get_list("/branches")]
+        locations = [loc for loc in atms + branches if (loc.get("geocode") or {}).get("lat") is not None]
+
+        index = SpatialIndex(locations)
+        with self._lock:
+            self.index, self.refreshed_at = index, time.time()
+        return len(index)
+
+    def nearest(self, lat, lng, k=5, radius=None, **filters):
+        # Take the first snapshot on demand if the background refresh hasn't yet
+        if self.index is None:
+            with self._refresh_lock:
+                if self.index is None:
+                    self.refresh()
+        return self.index.nearest(lat, lng, k=k, radius=radius, **filters)
+
+    def start(self):
+        """
+        Refresh the snapshot on a background thread. Safe to call on every
+        request - only the first call starts the thread.
+        """
+        if self.refresh_interval <= 0:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Error refreshing locations: {str(e)}")
+                time.sleep(self.refresh_interval)
+
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=loop, name="location-refresh", daemon=True)
+        self._thread.start()
+
+
+def parse_open_at(value, day=None):
+    """
+    "HH:MM" (and an optional weekday name) to (weekday, minute of day); defaults to today
+    """
+    hour, _, minute = value.partition(":")
+    minutes = int(hour) * 60 + int(minute or 0)
+    if not 0 <= minutes < 24 * 60:
+        raise ValueError("open_at must be a time between 00:00 and 23:59")
+    weekday = DAYS.index(day[:3].lower()) if day else datetime.now().weekday()
+    return weekday, minutes
@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlencode
+
+# How long (seconds) a cached response stays fresh, by the resource an endpoint returns.
+# Locations barely change, balances move with every deposit/withdrawal/transfer.
+DEFAULT_TTLS = {
+    "atms": 3600,
+    "branches": 3600,
+    "customers": 300,
+    "customer": 300,
+    "bills": 60,
+    "deposits": 30,
+    "withdrawals": 30,
+    "transfers": 30,
+    "purchases": 30,
+    "accounts": 10,
+}
+DEFAULT_TTL = 30
+
+RESOURCES = set(DEFAULT_TTLS)
+
+
+def resource_for(endpoint):
+    """
+    Resource returned by an endpoint - the last known resource name in its path,
+    e.g. /customers/<id>/accounts -> accounts, /branches/<id> -> branches
+    """
+    for part in reversed([p for p in endpoint.split("/") if p]):
+        if part in RESOURCES:
+            return part
+    return None
+
+
+def cache_key(endpoint, params=None):
+    return f"{endpoint}?{urlencode(sorted((params or {}).items()))}"
+
+
+class ResponseCache:
+    """
+    In-process cache for Nessie GET responses.
+
+    Entries expire after a per-resource TTL and the least recently used ones
+    are evicted once either `max_entries` or `max_bytes` is exceeded.
+    Concurrent misses on the same key are coalesced so only one request goes
+    upstream. Cached values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttls=None,
+                 default_ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.clock = clock
+
+        self._entries = OrderedDict()  # key -> (endpoint, value, size, expires_at)
+        self._inflight = {}  # key -> Future shared by coalesced callers
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def ttl_for(self, endpoint):
+        return self.ttls.get(resource_for(endpoint), self.default_ttl)
+
+    def get_or_fetch(self, endpoint, params, fetch):
+        """
+        Return the cached response for endpoint+params, calling `fetch()` on a miss.
+        `fetch` must return a (value, size_in_bytes) tuple; errors are not cached.
+        """
+        key = cache_key(endpoint, params)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[3] > self.clock():
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return entry[1]
+                self._remove(key)
+                self._counters["expirations"] += 1
+
+            waiting = self._inflight.get(key)
+            if waiting is not None:
+                self._counters["coalesced"] += 1
+            else:
+                self._counters["misses"] += 1
+                leader = self._inflight[key] = Future()
+
+        if waiting is not None:
+            return waiting.result()
+
+        try:
+            value, size = fetch()
+        except BaseException as e:
+            with self._lock:
+                if self._inflight.get(key) is leader:
+                    del self._inflight[key]
+            leader.set_exception(e)
+            raise
+
+        with self._lock:
+            # An invalidation while the request was in flight means the value may already be stale
+            if self._inflight.get(key) is leader:
+                del self._inflight[key]
+                self._store(key, endpoint, value, size)
+        leader.set_result(value)
+        return value
+
+    def invalidate(self, predicate):
+        """
+        Drop every entry whose endpoint matches `predicate(endpoint)`
+        """
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if predicate(entry[0])]
+            for key in keys:
+                self._remove(key)
+            # Requests already in flight may return pre-write data, so don't let them populate the cache
+            for key in [key for key in self._inflight if predicate(key.split("?", 1)[0])]:
+                del self._inflight[key]
+            self._counters["invalidations"] += len(keys)
+        return len(keys)
+
+    def invalidate_write(self, endpoint, data=None):
+        """
+        Invalidate what a POST/PUT/DELETE on `endpoint` may have changed.
+
+        A write under /accounts/<id> or /customers/<id> only drops entries for
+        the ids involved - the account, any payer/payee, the customers owning
+        them (read from cached /accounts/<id> responses) - and the list of all
+        accounts. A write addressed by record id alone, e.g. DELETE /deposits/<id>,
+        doesn't say which account it hit, so every list of that resource and
+        every accounts list is dropped too.
+        """
+        parts = [p for p in endpoint.split("/") if p]
+        ids = {p for p in parts if p not in RESOURCES}
+        account_ids = {parts[1]} if len(parts) > 1 and parts[0] == "accounts" else set()
+        for field in ("payer_id", "payee_id", "account_id", "customer_id"):
+            if data and data.get(field):
+                ids.add(str(data[field]))
+                if field != "customer_id":
+                    account_ids.add(str(data[field]))
+
+        if len(parts) > 1 and parts[0] in ("accounts", "customers"):
+            owners = self._owners(account_ids)
+            ids |= {owner for owner in owners.values() if owner}
+            # An account whose owner isn't cached may be in any customer's account list
+            unowned = None in owners.values()
+
+            def affected(cached_endpoint):
+                segments = cached_endpoint.split("/")
+                return (cached_endpoint == "/accounts" or bool(ids.intersection(segments))
+                        or (unowned and segments[1] == "customers" and segments[-1] == "accounts"))
+        else:
+            list_suffixes = tuple(f"/{p}" for p in parts if p in RESOURCES) + ("/accounts",)
+
+            def affected(cached_endpoint):
+                return cached_endpoint.endswith(list_suffixes) or bool(ids.intersection(cached_endpoint.split("/")))
+
+        return self.invalidate(affected)
+
+    def _owners(self, account_ids):
+        """
+        Customer id owning each account, from its cached /accounts/<id> response (None if not cached)
+        """
+        owners = {}
+        with self._lock:
+            for account_id in account_ids:
+                entry = self._entries.get(cache_key(f"/accounts/{account_id}"))
+                account = entry[1] if entry is not None else None
+                owners[account_id] = account.get("customer_id") if isinstance(account, dict) else None
+        return owners
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._inflight.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"] + self._counters["coalesced"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+            }
+
+    def _store(self, key, endpoint, value, size):
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (endpoint, value, size, self.clock() + self.ttl_for(endpoint))
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._counters["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
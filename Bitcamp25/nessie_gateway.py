@@ -0,0 +1,296 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from instrumentation import operation_name, upstream_span
+from nessie_cache import ResponseCache
+
+# Nessie settings - override with environment variables (e.g. to point at a local stub)
+NESSIE_BASE_URL = os.environ.get("NESSIE_BASE_URL", "http://api.nessieisreal.com")
+NESSIE_API_KEY = os.environ.get("NESSIE_API_KEY", "f1fbb5f9a7bfdc1597fafdf76476cfa7")
+
+# Connection pool and timeout settings
+NESSIE_POOL_SIZE = int(os.environ.get("NESSIE_POOL_SIZE", "20"))
+NESSIE_CONNECT_TIMEOUT = float(os.environ.get("NESSIE_CONNECT_TIMEOUT", "3.05"))
+NESSIE_READ_TIMEOUT = float(os.environ.get("NESSIE_READ_TIMEOUT", "10"))
+# How long the async gateway waits for a free pooled connection. Each account
+# activity lookup takes three, so under load this queue is longer than one upstream call.
+NESSIE_POOL_TIMEOUT = float(os.environ.get("NESSIE_POOL_TIMEOUT", "30"))
+
+# Response cache settings - set NESSIE_CACHE_MAX_ENTRIES=0 to turn caching off
+NESSIE_CACHE_MAX_ENTRIES = int(os.environ.get("NESSIE_CACHE_MAX_ENTRIES", "1024"))
+NESSIE_CACHE_MAX_BYTES = int(os.environ.get("NESSIE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# The three transaction lists that make up an account's activity, and the
+# type each record is tagged with once merged (same as Finance.fetchTransactions)
+TRANSACTION_TYPES = {
+    "deposits": "deposit",
+    "withdrawals": "withdrawal",
+    "transfers": "transfer",
+}
+
+
+class NessieError(Exception):
+    """
+    Raised when the Nessie API returns an error or cannot be reached
+    """
+
+    def __init__(self, message, status_code=502, reached=True):
+        super().__init__(message)
+        self.status_code = status_code
+        # False only when the request is known never to have reached Nessie
+        # (it couldn't connect) - safe to resend even if it was a write
+        self.reached = reached
+
+
+def transaction_date(transaction):
+    """
+    Date a transaction is sorted by - transfers may only carry a payment_date
+    """
+    return transaction.get("transaction_date") or transaction.get("payment_date") or ""
+
+
+class NessieGateway:
+    """
+    Server-side client for the Nessie API.
+
+    A single requests.Session is shared by every call so connections are kept
+    alive and reused, with at most `pool_size` open connections per host.
+    Composite lookups fan out over a small thread pool.
+
+    When a ResponseCache is given, GETs are served from it and every write
+    invalidates the cached responses it may have changed.
+    """
+
+    def __init__(self, base_url=NESSIE_BASE_URL, api_key=NESSIE_API_KEY,
+                 pool_size=NESSIE_POOL_SIZE,
+                 timeout=(NESSIE_CONNECT_TIMEOUT, NESSIE_READ_TIMEOUT),
+                 cache=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.cache = cache
+
+        self.session = requests.Session()
+        self.session.headers.update({"Accept": "application/json"})
+
+        # pool_block keeps us at pool_size connections per host instead of
+        # opening (and then discarding) extra ones under load
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="nessie")
+
+    def request(self, method, endpoint, params=None, json=None):
+        """
+        Make a request against a Nessie endpoint and return the parsed JSON body
+        """
+        if self.cache is None:
+            return self._send(method, endpoint, params, json)[0]
+
+        if method == "GET":
+            return self.cache.get_or_fetch(
+                endpoint, params, lambda: self._send(method, endpoint, params, json)
+            )
+
+        try:
+            return self._send(method, endpoint, params, json)[0]
+        finally:
+            # Invalidate even on errors - a timed out write may still have gone through
+            self.cache.invalidate_write(endpoint, json)
+
+    def _send(self, method, endpoint, params, json):
+        """
+        Send a request upstream, returning the parsed body and its size in bytes
+        """
+        query = dict(params or {})
+        query["key"] = self.api_key
+
+        with upstream_span("nessie", operation_name(method, endpoint)) as span:
+            try:
+                response = self.session.request(
+                    method,
+                    f"{self.base_url}{endpoint}",
+                    params=query,
+                    json=json,
+                    timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                span["status"] = "error"
+                # A read timeout or dropped connection may come after Nessie got the request
+                connect_failed = isinstance(e, requests.ConnectTimeout) or (
+                    isinstance(e, requests.ConnectionError)
+                    and isinstance(getattr(e.args[0] if e.args else None, "reason", None), NewConnectionError)
+                )
+                raise NessieError(f"Could not reach Nessie for {method} {endpoint}: {e!r}", reached=not connect_failed)
+            span["status"], span["bytes"] = response.status_code, len(response.content)
+
+        if response.status_code >= 400:
+            raise NessieError(
+                f"Nessie {method} {endpoint} failed with status {response.status_code}: {response.text}",
+                status_code=response.status_code,
+            )
+
+        if response.status_code == 204 or not response.content:
+            return {"success": True}, 0
+        return response.json(), len(response.content)
+
+    def get(self, endpoint, params=None):
+        return self.request("GET", endpoint, params=params)
+
+    def post(self, endpoint, data):
+        return self.request("POST", endpoint, json=data)
+
+    def put(self, endpoint, data):
+        return self.request("PUT", endpoint, json=data)
+
+    def delete(self, endpoint):
+        return self.request("DELETE", endpoint)
+
+    def get_list(self, endpoint, params=None):
+        """
+        Fetch a list endpoint, treating a 404 as an empty list like the frontend does
+        """
+        try:
+            result = self.get(endpoint, params=params)
+        except NessieError as e:
+            if e.status_code == 404:
+                return []
+            raise
+        return result if isinstance(result, list) else []
+
+    def get_account_activity(self, account_id):
+        """
+        Fetch deposits, withdrawals and transfers for an account concurrently
+        and return them merged, newest first
+        """
+        futures = {
+            # Run in a copy of this context so the calls are traced under the current request
+            resource: self._executor.submit(
+                contextvars.copy_context().run, self.get_list, f"/accounts/{account_id}/{resource}"
+            )
+            for resource in TRANSACTION_TYPES
+        }
+
+        activity = []
+        for resource, future in futures.items():
+            kind = TRANSACTION_TYPES[resource]
+            activity.extend({**transaction, "type": kind} for transaction in future.result())
+
+        activity.sort(key=transaction_date, reverse=True)
+        return activity
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+class AsyncNessieGateway:
+    """
+    asyncio counterpart of NessieGateway for the ASGI server (asgi_app.py).
+
+    Shares one httpx.AsyncClient, so connections are kept alive with at most
+    `pool_size` per host, and fans composite lookups out with asyncio.gather.
+    Requests beyond `pool_size` wait on a semaphore rather than in httpx's
+    pool, whose assignment loop scans every queued request against every
+    connection and gets CPU-bound under load. Responses are not cached.
+    """
+
+    def __init__(self, base_url=NESSIE_BASE_URL, api_key=NESSIE_API_KEY,
+                 pool_size=NESSIE_POOL_SIZE,
+                 timeout=(NESSIE_CONNECT_TIMEOUT, NESSIE_READ_TIMEOUT),
+                 pool_timeout=NESSIE_POOL_TIMEOUT):
+        self.api_key = api_key
+        self.pool_timeout = pool_timeout
+        self._slots = asyncio.Semaphore(pool_size)
+        connect_timeout, read_timeout = timeout
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers={"Accept": "application/json"},
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            # Waiting for a free pooled connection is backpressure, not a slow upstream,
+            # so it gets its own longer limit instead of the read timeout
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout),
+        )
+
+    async def request(self, method, endpoint, params=None, json=None):
+        """
+        Make a request against a Nessie endpoint and return the parsed JSON body
+        """
+        query = dict(params or {})
+        query["key"] = self.api_key
+
+        with upstream_span("nessie", operation_name(method, endpoint)) as span:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.pool_timeout)
+            except asyncio.TimeoutError:
+                span["status"] = "error"
+                raise NessieError(f"Could not reach Nessie for {method} {endpoint}: no free connection "
+                                  f"within {self.pool_timeout}s", reached=False)
+            try:
+                response = await self.client.request(method, endpoint, params=query, json=json)
+            except httpx.HTTPError as e:
+                span["status"] = "error"
+                connect_failed = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+                raise NessieError(f"Could not reach Nessie for {method} {endpoint}: {e!r}", reached=not connect_failed)
+            finally:
+                self._slots.release()
+            span["status"], span["bytes"] = response.status_code, len(response.content)
+
+        if response.status_code >= 400:
+            raise NessieError(
+                f"Nessie {method} {endpoint} failed with status {response.status_code}: {response.text}",
+                status_code=response.status_code,
+            )
+
+        if response.status_code == 204 or not response.content:
+            return {"success": True}
+        return response.json()
+
+    async def get(self, endpoint, params=None):
+        return await self.request("GET", endpoint, params=params)
+
+    async def get_list(self, endpoint, params=None):
+        """
+        Fetch a list endpoint, treating a 404 as an empty list like the frontend does
+        """
+        try:
+            result = await self.get(endpoint, params=params)
+        except NessieError as e:
+            if e.status_code == 404:
+                return []
+            raise
+        return result if isinstance(result, list) else []
+
+    async def get_account_activity(self, account_id):
+        """
+        Fetch deposits, withdrawals and transfers for an account concurrently
+        and return them merged, newest first
+        """
+        results = await asyncio.gather(*(
+            self.get_list(f"/accounts/{account_id}/{resource}") for resource in TRANSACTION_TYPES
+        ))
+
+        activity = []
+        for kind, transactions in zip(TRANSACTION_TYPES.values(), results):
+            activity.extend({**transaction, "type": kind} for transaction in transactions)
+
+        activity.sort(key=transaction_date, reverse=True)
+        return activity
+
+    async def close(self):
+        await self.client.aclose()
+
+
+# Shared gateway used by the Flask routes
+nessie = NessieGateway(
+    cache=ResponseCache(max_entries=NESSIE_CACHE_MAX_ENTRIES, max_bytes=NESSIE_CACHE_MAX_BYTES)
+    if NESSIE_CACHE_MAX_ENTRIES > 0 else None
+)
@@ -0,0 +1,4 @@
+import os
+
+# Retell API key shared by app.py and asgi_app.py - in production, set RETELL_API_KEY
+RETELL_API_KEY = os.environ.get("RETELL_API_KEY", "key_8b4cb3a3d82ca7bb3a100e558ce8")
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from collections import deque
+
+from instrumentation import create_web_call
+
+# Opt-in: comma separated agent ids to keep pre-created web calls for
+RETELL_TOKEN_POOL_AGENTS = [a for a in os.environ.get("RETELL_TOKEN_POOL_AGENTS", "").split(",") if a]
+RETELL_TOKEN_POOL_SIZE = int(os.environ.get("RETELL_TOKEN_POOL_SIZE", "2"))
+# Web call access tokens expire 30s after creation unless the call is started,
+# so pooled tokens are dropped a little before that
+RETELL_TOKEN_MAX_AGE = float(os.environ.get("RETELL_TOKEN_MAX_AGE", "25"))
+
+
+class WebCallTokenPool:
+    """
+    Keeps up to `size` fresh web calls ready per agent so /api/generate-token
+    can hand one out without waiting on Retell.
+
+    A background thread tops the pool up as tokens are taken and drops any
+    older than `max_age` seconds. On a miss, or for an agent that is not
+    pooled (counted as `unpooled`, not as a miss), the call is created
+    directly. `client` is anything with a Retell-style
+    `client.call.create_web_call(agent_id=...)`.
+    """
+
+    def __init__(self, client, agent_ids, size=RETELL_TOKEN_POOL_SIZE,
+                 max_age=RETELL_TOKEN_MAX_AGE, retry_delay=1.0, clock=time.monotonic):
+        self.client = client
+        self.size = size
+        self.max_age = max_age
+        self.retry_delay = retry_delay
+        self.clock = clock
+
+        self._pools = {agent_id: deque() for agent_id in agent_ids}  # agent -> deque of (created_at, token)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._counters = {"hits": 0, "misses": 0, "unpooled": 0, "expired": 0, "created": 0, "refill_errors": 0}
+        self._refill_latencies = deque(maxlen=100)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._refill_loop, name="retell-token-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def acquire(self, agent_id):
+        """
+        Take a fresh pooled token for the agent, or None if there isn't one
+        """
+        pool = self._pools.get(agent_id)
+        if pool is None:
+            return None
+
+        now = self.clock()
+        with self._lock:
+            while pool:
+                created_at, token = pool.popleft()
+                if now - created_at < self.max_age:
+                    self._counters["hits"] += 1
+                    self._wake.set()
+                    return token
+                self._counters["expired"] += 1
+        return None
+
+    def get_token(self, agent_id):
+        """
+        Web call details for the agent - from the pool when possible, created directly otherwise
+        """
+        if agent_id not in self._pools:
+            with self._lock:
+                self._counters["unpooled"] += 1
+            return self._create(agent_id)
+
+        token = self.acquire(agent_id)
+        if token is not None:
+            return token
+
+        with self._lock:
+            self._counters["misses"] += 1
+        self._wake.set()
+        return self._create(agent_id)
+
+    def stats(self):
+        now = self.clock()
+        with self._lock:
+            latencies = list(self._refill_latencies)
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+                "target_size": self.size,
+                "depth": {
+                    agent_id: sum(1 for created_at, _ in pool if now - created_at < self.max_age)
+                    for agent_id, pool in self._pools.items()
+                },
+                "refill_latency_ms": {
+                    "last": latencies[-1] * 1000 if latencies else None,
+                    "avg": sum(latencies) / len(latencies) * 1000 if latencies else None,
+                    "max": max(latencies) * 1000 if latencies else None,
+                },
+            }
+
+    def _create(self, agent_id):
+        web_call_response = create_web_call(self.client, agent_id=agent_id)
+        return web_call_response.model_dump()
+
+    def _refill_loop(self):
+        while not self._stopped.is_set():
+            self._wake.clear()
+            next_expiry = None
+
+            for agent_id, pool in self._pools.items():
+                self._drop_expired(pool)
+                while len(pool) < self.size and not self._stopped.is_set():
+                    started = self.clock()
+                    try:
+                        token = self._create(agent_id)
+                    except Exception as e:
+                        print(f"Error refilling web call token pool for {agent_id}: {str(e)}")
+                        with self._lock:
+                            self._counters["refill_errors"] += 1
+                        self._stopped.wait(self.retry_delay)
+                        break
+                    with self._lock:
+                        # Age from when the request went out - Retell's clock starts before ours can see it
+                        pool.append((started, token))
+                        self._counters["created"] += 1
+                        self._refill_latencies.append(self.clock() - started)
+
+                with self._lock:
+                    if pool:
+                        oldest = pool[0][0] + self.max_age
+                        next_expiry = oldest if next_expiry is None else min(next_expiry, oldest)
+
+            # Sleep until a token is taken or the oldest pooled one is about to expire
+            timeout = self.retry_delay if next_expiry is None else max(next_expiry - self.clock(), 0.01)
+            self._wake.wait(timeout)
+
+    def _drop_expired(self, pool):
+        now = self.clock()
+        with self._lock:
+            while pool and now - pool[0][0] >= self.max_age:
+                pool.popleft()
+                self._counters["expired"] += 1
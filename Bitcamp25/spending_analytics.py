@@ -0,0 +1,285 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+# Type codes used in the columnar arrays
+TYPE_CODES = {"deposit": 0, "withdrawal": 1, "transfer": 2}
+TYPE_NAMES = list(TYPE_CODES)
+
+MONDAY = np.datetime64("1970-01-05", "D")
+
+# Query string arguments each query accepts: name -> (type, allowed values or None).
+# For integers the second item is the largest value allowed (the smallest is 1).
+QUERY_ARGS = {
+    "summary": {},
+    "totals": {"by": (str, ("merchant", "type")), "start": (str, None), "end": (str, None)},
+    "monthly": {"window": (int, 120)},
+    "compare": {"period": (str, ("week", "month", "year"))},
+    "largest": {"n": (int, 100), "direction": (str, ("in", "out")), "start": (str, None), "end": (str, None)},
+    "balance": {"days": (int, 3660)},
+}
+
+
+class AccountColumns:
+    """
+    An account's transactions as parallel NumPy arrays, oldest first.
+    `amounts` are signed: money in is positive, money out negative.
+    """
+
+    def __init__(self, rows, balance):
+        # Records with no date can't be placed on the timeline - leave them out
+        rows = [row for row in rows if row[0]]
+        dates, types, amounts, descriptions, outgoing = zip(*rows) if rows else ((),) * 5
+        count = len(rows)
+        self.balance = balance or 0.0
+        self.dates = np.array(dates, dtype="datetime64[D]")
+        self.types = np.fromiter(map(TYPE_CODES.__getitem__, types), dtype=np.int8, count=count)
+
+        amounts = np.nan_to_num(np.array(amounts, dtype=np.float64))
+        outgoing = np.array(outgoing, dtype=bool)
+        # Withdrawals always take money out, transfers only when this account is the payer
+        money_out = (self.types == TYPE_CODES["withdrawal"]) | ((self.types == TYPE_CODES["transfer"]) & outgoing)
+        self.amounts = np.where(money_out, -amounts, amounts)
+
+        self.merchant_names, self.merchants = np.unique(
+            np.array([d or "Unknown" for d in descriptions], dtype=str), return_inverse=True
+        )
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def mask(self, start=None, end=None):
+        selected = np.ones(len(self), dtype=bool)
+        if start:
+            selected &= self.dates >= np.datetime64(start, "D")
+        if end:
+            selected &= self.dates <= np.datetime64(end, "D")
+        return selected
+
+
+def round_money(values):
+    return [round(float(v), 2) for v in values]
+
+
+def totals(columns, by="merchant", start=None, end=None):
+    """
+    Money in and out grouped by merchant (transaction description) or by type, biggest spend first
+    """
+    selected = columns.mask(start, end)
+    if by == "type":
+        codes, names = columns.types[selected], TYPE_NAMES
+    else:
+        codes, names = columns.merchants[selected], columns.merchant_names
+    amounts = columns.amounts[selected]
+
+    spent = np.bincount(codes, weights=np.where(amounts < 0, -amounts, 0), minlength=len(names))
+    received = np.bincount(codes, weights=np.where(amounts > 0, amounts, 0), minlength=len(names))
+    counts = np.bincount(codes, minlength=len(names))
+
+    order = np.lexsort((-received, -spent))
+    return [
+        {by: str(names[i]), "spent": round(float(spent[i]), 2), "received": round(float(received[i]), 2),
+         "count": int(counts[i])}
+        for i in order if counts[i]
+    ]
+
+
+def monthly(columns, window=3):
+    """
+    Money in/out per calendar month (including empty months) with a rolling average of spending
+    """
+    if not len(columns):
+        return []
+
+    months = columns.dates.astype("datetime64[M]")
+    first = months.min()
+    index = (months - first).astype(np.int64)
+    size = int(index.max()) + 1
+
+    spent = np.bincount(index, weights=np.where(columns.amounts < 0, -columns.amounts, 0), minlength=size)
+    received = np.bincount(index, weights=np.where(columns.amounts > 0, columns.amounts, 0), minlength=size)
+
+    # Rolling mean over the last `window` months; shorter at the start of the series
+    cumulative = np.concatenate(([0.0], np.cumsum(spent)))
+    starts = np.maximum(np.arange(size) - window + 1, 0)
+    rolling = (cumulative[1:] - cumulative[starts]) / (np.arange(size) - starts + 1)
+
+    labels = np.arange(first, first + size).astype(str)
+    return [
+        {"month": label, "spent": s, "received": r, "net": round(r - s, 2), f"spent_avg_{window}m": a}
+        for label, s, r, a in zip(labels, round_money(spent), round_money(received), round_money(rolling))
+    ]
+
+
+def compare_periods(columns, period="month", today=None):
+    """
+    Spending and income in the current period so far vs. the same span of the previous period
+    """
+    today = np.datetime64(today or date.today().isoformat(), "D")
+    if period == "week":
+        # datetime64[W] weeks start on Thursdays, so count back to Monday instead
+        current_start = today - np.timedelta64(int((today - MONDAY).astype(np.int64)) % 7, "D")
+        previous_start = current_start - 7
+    else:
+        unit = {"month": "M", "year": "Y"}[period]
+        current_start = today.astype(f"datetime64[{unit}]").astype("datetime64[D]")
+        previous_start = (today.astype(f"datetime64[{unit}]") - 1).astype("datetime64[D]")
+    # Compare like for like: the previous period only up to the same day offset
+    previous_end = min(previous_start + (today - current_start), current_start - 1)
+
+    def summarize(start, end):
+        selected = (columns.dates >= start) & (columns.dates <= end)
+        amounts = columns.amounts[selected]
+        return {
+            "start": str(start),
+            "end": str(end),
+            # + 0.0 turns the -0.0 of negating an empty sum into 0.0
+            "spent": round(float(-amounts[amounts < 0].sum()) + 0.0, 2),
+            "received": round(float(amounts[amounts > 0].sum()), 2),
+            "count": int(selected.sum()),
+        }
+
+    current, previous = summarize(current_start, today), summarize(previous_start, previous_end)
+    change = None
+    if previous["spent"]:
+        change = round((current["spent"] - previous["spent"]) / previous["spent"] * 100, 1)
+    return {"period": period, "current": current, "previous": previous, "spent_change_pct": change}
+
+
+def largest(columns, n=5, direction="out", start=None, end=None):
+    """
+    The `n` largest transactions by amount moving in the given direction (in/out)
+    """
+    indices = np.flatnonzero(columns.mask(start, end))
+    amounts = columns.amounts[indices]
+    if direction == "out":
+        indices, magnitudes = indices[amounts < 0], -amounts[amounts < 0]
+    else:
+        indices, magnitudes = indices[amounts > 0], amounts[amounts > 0]
+
+    n = min(n, len(indices))
+    if not n:
+        return []
+    top = np.argpartition(-magnitudes, n - 1)[:n]
+    top = top[np.argsort(-magnitudes[top])]
+    return [
+        {"date": str(columns.dates[i]), "type": TYPE_NAMES[columns.types[i]],
+         "description": str(columns.merchant_names[columns.merchants[i]]),
+         "amount": round(float(magnitudes[j]), 2)}
+        for i, j in zip(indices[top], top)
+    ]
+
+
+def average_balance(columns, days=30, today=None):
+    """
+    Average end-of-day balance over the last `days` days, reconstructed backwards
+    from the current balance using each day's net flow
+    """
+    today = np.datetime64(today or date.today().isoformat(), "D")
+    first = today - (days - 1)
+
+    # Net flow per day in the window, plus everything after today (future-dated records)
+    in_window = (columns.dates >= first) & (columns.dates <= today)
+    daily_net = np.bincount((columns.dates[in_window] - first).astype(np.int64),
+                            weights=columns.amounts[in_window], minlength=days)
+    after = columns.amounts[columns.dates > today].sum()
+
+    # Balance at the end of day d = current balance minus everything that happened after d
+    end_of_today = columns.balance - after
+    flows_after = np.concatenate((np.cumsum(daily_net[::-1])[::-1][1:], [0.0]))
+    balances = end_of_today - flows_after
+
+    return {
+        "days": days,
+        "current_balance": round(float(columns.balance), 2),
+        "average_balance": round(float(balances.mean()), 2),
+        "min_balance": round(float(balances.min()), 2),
+        "max_balance": round(float(balances.max()), 2),
+    }
+
+
+def summary(columns, today=None):
+    amounts = columns.amounts
+    return {
+        "transactions": len(columns),
+        "first_date": str(columns.dates[0]) if len(columns) else None,
+        "last_date": str(columns.dates[-1]) if len(columns) else None,
+        "total_spent": round(float(-amounts[amounts < 0].sum()) + 0.0, 2),
+        "total_received": round(float(amounts[amounts > 0].sum()), 2),
+        "average_transaction": round(float(np.abs(amounts).mean()), 2) if len(columns) else 0.0,
+        "this_month": compare_periods(columns, "month", today),
+        "top_merchants": totals(columns)[:5],
+        "largest_expenses": largest(columns, 3),
+    }
+
+
+class SpendingAnalytics:
+    """
+    Answers aggregate questions about an account from the ledger replica.
+
+    An account's transactions are loaded into NumPy columns once per ledger
+    data version, and results are memoized per (account, version, query) -
+    a sync that changes the account bumps its version and so invalidates both.
+    """
+
+    QUERIES = {
+        "summary": summary,
+        "totals": totals,
+        "monthly": monthly,
+        "compare": compare_periods,
+        "largest": largest,
+        "balance": average_balance,
+    }
+
+    def __init__(self, ledger, max_accounts=64, max_results=1024):
+        self.ledger = ledger
+        self.max_accounts = max_accounts
+        self.max_results = max_results
+        self._columns = OrderedDict()  # (account_id, version) -> AccountColumns
+        self._results = OrderedDict()  # (account_id, version, query, args) -> result
+        self._lock = threading.Lock()
+        # Load the new columns as soon as a sync changes an account
+        ledger.listeners.append(self.columns)
+
+    def columns(self, account_id, version):
+        key = (account_id, version)
+        with self._lock:
+            if key in self._columns:
+                self._columns.move_to_end(key)
+                return self._columns[key]
+
+        rows, balance = self.ledger.account_columns(account_id)
+        columns = AccountColumns(rows, balance)
+
+        with self._lock:
+            self._columns[key] = columns
+            while len(self._columns) > self.max_accounts:
+                self._columns.popitem(last=False)
+        return columns
+
+    def query(self, account_id, name, **kwargs):
+        """
+        Run one of QUERIES for an account, or None if the account isn't in the replica
+        """
+        version = self.ledger.account_version(account_id)
+        if version is None:
+            return None
+
+        # Anything relative to "today" has to be recomputed when the date changes
+        if name in ("summary", "compare", "balance"):
+            kwargs.setdefault("today", date.today().isoformat())
+        key = (account_id, version, name, tuple(sorted(kwargs.items())))
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+
+        result = self.QUERIES[name](self.columns(account_id, version), **kwargs)
+
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result
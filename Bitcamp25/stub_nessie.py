@@ -0,0 +1,271 @@
+"""
+A small in-memory stand-in for the Nessie API.
+
+Serves the same paths the gateway uses so it can be run locally while testing
+or benchmarking the server without touching the real API:
+
+    python stub_nessie.py --port 5055 --transactions 500 --latency 0.05
+    NESSIE_BASE_URL=http://127.0.0.1:5055 python app.py
+"""
+import argparse
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+# werkzeug listens with a backlog of 128, so a load test's burst of connections
+# times out on connect before the stub ever sees it
+LISTEN_BACKLOG = 1024
+
+CUSTOMER_ID = "67fb0a2b9683f20dd519556e"
+ACCOUNT_ID = "67fb0a2b9683f20dd519556f"
+
+# Resource name -> (record type, id field that links it to an account)
+TRANSACTION_RESOURCES = {
+    "deposits": ("deposit", "payee_id"),
+    "withdrawals": ("withdrawal", "payer_id"),
+    "transfers": ("p2p", "payer_id"),
+}
+
+DESCRIPTIONS = ["Grocery store", "Coffee shop", "Gas station", "Restaurant", "Online shopping",
+                "Rent", "Salary", "Utilities", "Pharmacy", "Movie theater"]
+
+
+def new_id():
+    return uuid.uuid4().hex[:24]
+
+
+def make_transaction(resource, account_id, day):
+    kind, link_field = TRANSACTION_RESOURCES[resource]
+    transaction = {
+        "_id": new_id(),
+        "type": kind,
+        "transaction_date": day.isoformat(),
+        "status": "executed",
+        "medium": "balance",
+        "amount": round(random.uniform(5, 500), 2),
+        "description": random.choice(DESCRIPTIONS),
+        link_field: account_id,
+    }
+    if resource == "transfers":
+        transaction["payee_id"] = new_id()
+    return transaction
+
+
+def seed_store(transactions=30, locations=20, seed=0):
+    """
+    Build the in-memory data set: one customer, one account, `transactions`
+    records spread across deposits/withdrawals/transfers, and some ATMs and branches
+    """
+    random.seed(seed)
+    store = {
+        "customers": {
+            CUSTOMER_ID: {
+                "_id": CUSTOMER_ID,
+                "first_name": "John",
+                "last_name": "Doe",
+                "address": {"street_number": "123", "street_name": "Main St",
+                            "city": "Washington", "state": "DC", "zip": "20001"},
+            }
+        },
+        "accounts": {
+            ACCOUNT_ID: {
+                "_id": ACCOUNT_ID,
+                "type": "Checking",
+                "nickname": "Primary Checking",
+                "rewards": 10,
+                "balance": 5000,
+                "account_number": "1234567890123456",
+                "customer_id": CUSTOMER_ID,
+            }
+        },
+        "deposits": {},
+        "withdrawals": {},
+        "transfers": {},
+        "atms": {},
+        "branches": {},
+    }
+
+    start = date.today() - timedelta(days=365)
+    resources = list(TRANSACTION_RESOURCES)
+    for i in range(transactions):
+        resource = resources[i % len(resources)]
+        transaction = make_transaction(resource, ACCOUNT_ID, start + timedelta(days=random.randint(0, 365)))
+        store[resource][transaction["_id"]] = transaction
+
+    for i in range(locations):
+        lat, lng = 38.9 + random.uniform(-0.5, 0.5), -77.03 + random.uniform(-0.5, 0.5)
+        atm_id, branch_id = new_id(), new_id()
+        store["atms"][atm_id] = {
+            "_id": atm_id,
+            "name": f"ATM {i}",
+            "language_list": random.sample(["English", "Spanish", "French", "Chinese"], 2),
+            "geocode": {"lat": lat, "lng": lng},
+            "hours": [random.choice(["24/7", "6:00-22:00", "9:00-17:00"])],
+            "accessibility": random.random() < 0.6,
+            "amount_left": random.randint(0, 10000),
+        }
+        store["branches"][branch_id] = {
+            "_id": branch_id,
+            "name": f"Capital One Branch {i}",
+            "hours": ["Mon-Fri: 9:00-17:00", "Sat: 10:00-14:00"],
+            "phone_number": "202-555-0123",
+            "geocode": {"lat": lat + 0.01, "lng": lng + 0.01},
+            "address": {"street_number": str(i), "street_name": "Financial Ave",
+                        "city": "Washington", "state": "DC", "zip": "20001"},
+        }
+    return store
+
+
+def create_app(store=None, latency=0.0):
+    """
+    Create the stub Flask app. `latency` seconds are added to every response
+    to make upstream round trips visible in benchmarks.
+    """
+    app = Flask(__name__)
+    store = store if store is not None else seed_store()
+    lock = threading.Lock()
+    app.config["STORE"] = store
+    app.config["REQUEST_COUNT"] = 0
+
+    def not_found():
+        return jsonify({"code": 404, "message": "Not found"}), 404
+
+    @app.before_request
+    def simulate_latency():
+        with lock:
+            app.config["REQUEST_COUNT"] += 1
+        if latency:
+            time.sleep(latency)
+
+    @app.route("/customers")
+    def list_customers():
+        return jsonify(list(store["customers"].values()))
+
+    @app.route("/customers/<customer_id>")
+    def get_customer(customer_id):
+        customer = store["customers"].get(customer_id)
+        return jsonify(customer) if customer else not_found()
+
+    @app.route("/customers/<customer_id>/accounts", methods=["GET", "POST"])
+    def customer_accounts(customer_id):
+        if customer_id not in store["customers"]:
+            return not_found()
+        if request.method == "POST":
+            account = {**request.json, "_id": new_id(), "customer_id": customer_id}
+            with lock:
+                store["accounts"][account["_id"]] = account
+            return jsonify({"code": 201, "message": "Created account", "objectCreated": account}), 201
+        return jsonify([a for a in store["accounts"].values() if a["customer_id"] == customer_id])
+
+    @app.route("/accounts")
+    def list_accounts():
+        return jsonify(list(store["accounts"].values()))
+
+    @app.route("/accounts/<account_id>", methods=["GET", "PUT"])
+    def get_account(account_id):
+        account = store["accounts"].get(account_id)
+        if not account:
+            return not_found()
+        if request.method == "PUT":
+            with lock:
+                account.update(request.json or {})
+            return jsonify({"code": 202, "message": "Accepted account update"}), 202
+        return jsonify(account)
+
+    @app.route("/accounts/<account_id>/customer")
+    def get_account_customer(account_id):
+        account = store["accounts"].get(account_id)
+        if not account:
+            return not_found()
+        return jsonify(store["customers"][account["customer_id"]])
+
+    @app.route("/accounts/<account_id>/<resource>", methods=["GET", "POST"])
+    def account_transactions(account_id, resource):
+        if resource not in TRANSACTION_RESOURCES or account_id not in store["accounts"]:
+            return not_found()
+        kind, link_field = TRANSACTION_RESOURCES[resource]
+        if request.method == "POST":
+            transaction = {
+                "status": "pending",
+                "transaction_date": date.today().isoformat(),
+                **(request.json or {}),
+                "_id": new_id(),
+                "type": kind,
+                link_field: account_id,
+            }
+            with lock:
+                store[resource][transaction["_id"]] = transaction
+            return jsonify({"code": 201, "message": "Created", "objectCreated": transaction}), 201
+        return jsonify([
+            t for t in store[resource].values()
+            if t.get(link_field) == account_id or t.get("payee_id") == account_id
+        ])
+
+    @app.route("/<resource>/<object_id>", methods=["GET", "PUT", "DELETE"])
+    def transaction_by_id(resource, object_id):
+        if resource not in ("deposits", "withdrawals", "transfers", "atms", "branches"):
+            return not_found()
+        record = store[resource].get(object_id)
+        if not record:
+            return not_found()
+        if request.method == "PUT":
+            with lock:
+                record.update(request.json or {})
+            return jsonify({"code": 202, "message": "Accepted update"}), 202
+        if request.method == "DELETE":
+            with lock:
+                del store[resource][object_id]
+            return "", 204
+        return jsonify(record)
+
+    @app.route("/atms")
+    def list_atms():
+        return jsonify({"data": list(store["atms"].values()), "paging": {}})
+
+    @app.route("/branches")
+    def list_branches():
+        return jsonify(list(store["branches"].values()))
+
+    return app
+
+
+class StubServer:
+    """
+    Runs a stub app on a background thread - used by the benchmark scripts
+    """
+
+    def __init__(self, app, host="127.0.0.1", port=0):
+        # Keep per-request access logs out of benchmark output
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        self.server = make_server(host, port, app, threaded=True)
+        self.server.socket.listen(LISTEN_BACKLOG)
+        self.url = f"http://{host}:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub of the Nessie API")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--transactions", type=int, default=30)
+    parser.add_argument("--locations", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+
+    stub = create_app(seed_store(args.transactions, args.locations), latency=args.latency)
+    print(f"Starting stub Nessie server on port {args.port}...")
+    server = make_server("127.0.0.1", args.port, stub, threaded=True)
+    server.socket.listen(LISTEN_BACKLOG)
+    server.serve_forever()
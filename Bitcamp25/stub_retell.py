@@ -0,0 +1,51 @@
+"""
+A minimal stand-in for the Retell API's web call endpoint.
+
+    python stub_retell.py --port 5056 --latency 0.1
+    RETELL_BASE_URL=http://127.0.0.1:5056 python app.py
+"""
+import argparse
+import time
+import uuid
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from stub_nessie import LISTEN_BACKLOG
+
+
+def create_app(latency=0.0):
+    """
+    Create the stub Flask app. `latency` seconds are added to every web call creation.
+    """
+    app = Flask(__name__)
+
+    # Older SDKs post to /v2, newer ones to /v3
+    @app.route("/v2/create-web-call", methods=["POST"])
+    @app.route("/v3/create-web-call", methods=["POST"])
+    def create_web_call():
+        if latency:
+            time.sleep(latency)
+        data = request.json or {}
+        return jsonify({
+            "call_type": "web_call",
+            "access_token": uuid.uuid4().hex,
+            "call_id": uuid.uuid4().hex,
+            "agent_id": data.get("agent_id"),
+            "agent_version": 1,
+            "call_status": "registered",
+        }), 201
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub of the Retell web call API")
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every web call")
+    args = parser.parse_args()
+
+    print(f"Starting stub Retell server on port {args.port}...")
+    server = make_server("127.0.0.1", args.port, create_app(latency=args.latency), threaded=True)
+    server.socket.listen(LISTEN_BACKLOG)
+    server.serve_forever()
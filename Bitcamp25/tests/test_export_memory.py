@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from export_bench import measure, populate  # noqa: E402
+from transaction_export import pq  # noqa: E402
+
+ROWS = 50000
+MAX_RSS_MB = 200
+
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("export") / "ledger.db")
+    populate(path, ROWS)
+    return path
+
+
+@pytest.mark.parametrize("export_format", ["ndjson", "csv", "parquet"])
+def test_export_stays_under_rss_ceiling(db_path, export_format):
+    if export_format == "parquet" and pq is None:
+        pytest.skip("pyarrow is not installed")
+
+    result = measure(db_path, export_format)
+
+    assert result["bytes"] > 0
+    assert result["peak_rss_mb"] < MAX_RSS_MB
@@ -0,0 +1,57 @@
+from ledger_replica import LedgerReplica
+from nessie_gateway import NessieError
+
+
+class FakeGateway:
+    """
+    Customers and their account ids, with one deposit per account
+    """
+
+    def __init__(self, customers):
+        self.customers = customers
+
+    def get(self, endpoint, params=None):
+        customer_id = endpoint.split("/")[2]
+        if customer_id not in self.customers:
+            raise NessieError("Not found", status_code=404)
+        return {"_id": customer_id}
+
+    def get_list(self, endpoint, params=None):
+        parts = endpoint.strip("/").split("/")
+        if parts == ["customers"]:
+            return [{"_id": customer_id} for customer_id in self.customers]
+        return [{"_id": account_id, "type": "Checking", "balance": 10.0} for account_id in self.customers[parts[1]]]
+
+    def get_account_activity(self, account_id):
+        return [{"_id": f"d_{account_id}", "type": "deposit", "transaction_date": "2025-01-01", "amount": 5.0}]
+
+
+def rows(ledger, table):
+    return {row["id"] for row in ledger._connection().execute(f"SELECT id FROM {table}")}
+
+
+def test_sync_deletes_closed_accounts():
+    gateway = FakeGateway({"c1": ["a1", "a2"], "c2": ["a3"]})
+    ledger = LedgerReplica(db_path=":memory:", gateway=gateway)
+    ledger.sync()
+
+    gateway.customers["c1"] = ["a1"]
+    counts = ledger.sync(["c1"])
+
+    assert counts["deleted"] == 2  # the account and its deposit
+    assert rows(ledger, "accounts") == {"a1", "a3"}
+    assert rows(ledger, "transactions") == {"d_a1", "d_a3"}
+
+
+def test_sync_deletes_removed_customers():
+    gateway = FakeGateway({"c1": ["a1"], "c2": ["a2"], "c3": ["a3"]})
+    ledger = LedgerReplica(db_path=":memory:", gateway=gateway)
+    ledger.sync()
+
+    del gateway.customers["c1"], gateway.customers["c2"]
+    assert ledger.sync(["c1"])["deleted"] == 3
+    assert ledger.sync()["deleted"] == 3
+
+    assert rows(ledger, "customers") == {"c3"}
+    assert rows(ledger, "accounts") == {"a3"}
+    assert rows(ledger, "transactions") == {"d_a3"}
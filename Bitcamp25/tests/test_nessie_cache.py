@@ -0,0 +1,57 @@
+from nessie_cache import ResponseCache
+
+
+def fill(cache, accounts=50):
+    """
+    Cache an account, its deposits and its customer's account list for each account
+    """
+    for i in range(accounts):
+        account = {"_id": f"a{i}", "customer_id": f"c{i}"}
+        cache.get_or_fetch(f"/accounts/a{i}", None, lambda: (account, 1))
+        cache.get_or_fetch(f"/accounts/a{i}/deposits", None, lambda: ([], 1))
+        cache.get_or_fetch(f"/customers/c{i}/accounts", None, lambda: ([account], 1))
+
+
+def cached(cache):
+    return {key.split("?", 1)[0] for key in cache._entries}
+
+
+def test_account_write_keeps_unrelated_accounts():
+    cache = ResponseCache()
+    fill(cache)
+
+    evicted = cache.invalidate_write("/accounts/a7/deposits", {"amount": 10})
+
+    assert evicted == 3
+    assert not cached(cache) & {"/accounts/a7", "/accounts/a7/deposits", "/customers/c7/accounts"}
+    assert {"/accounts/a8", "/accounts/a8/deposits", "/customers/c8/accounts"} <= cached(cache)
+
+
+def test_transfer_drops_payer_and_payee():
+    cache = ResponseCache()
+    fill(cache)
+
+    cache.invalidate_write("/accounts/a1/transfers", {"payee_id": "a2", "amount": 10})
+
+    assert not cached(cache) & {"/accounts/a1", "/accounts/a2", "/customers/c1/accounts", "/customers/c2/accounts"}
+    assert len(cached(cache)) == 150 - 6
+
+
+def test_account_write_with_unknown_owner_drops_customer_account_lists():
+    cache = ResponseCache()
+    fill(cache)
+    cache.invalidate(lambda endpoint: endpoint == "/accounts/a7")
+
+    cache.invalidate_write("/accounts/a7/deposits", {"amount": 10})
+
+    assert not any(endpoint.startswith("/customers/") for endpoint in cached(cache))
+    assert "/accounts/a8/deposits" in cached(cache)
+
+
+def test_record_write_drops_every_list_of_the_resource():
+    cache = ResponseCache()
+    fill(cache)
+
+    cache.invalidate_write("/deposits/d1")
+
+    assert cached(cache) == {f"/accounts/a{i}" for i in range(50)}
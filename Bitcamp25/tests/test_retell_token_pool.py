@@ -0,0 +1,80 @@
+import itertools
+import threading
+import time
+
+from retell_token_pool import WebCallTokenPool
+
+
+class FakeWebCall:
+    def __init__(self, agent_id, number):
+        self.agent_id, self.number = agent_id, number
+
+    def model_dump(self):
+        return {"agent_id": self.agent_id, "access_token": f"token_{self.number}"}
+
+
+class FakeCalls:
+    def __init__(self):
+        self.numbers = itertools.count()
+        self.lock = threading.Lock()
+
+    def create_web_call(self, agent_id):
+        with self.lock:
+            return FakeWebCall(agent_id, next(self.numbers))
+
+
+class FakeClient:
+    def __init__(self):
+        self.call = FakeCalls()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_hit_miss_expiry_and_refill():
+    clock = FakeClock()
+    pool = WebCallTokenPool(FakeClient(), ["agent_a"], size=2, max_age=25, clock=clock)
+
+    # Nothing pooled before the refill thread runs
+    assert pool.get_token("agent_a")["access_token"] == "token_0"
+    assert pool.stats()["misses"] == 1
+
+    pool.start()
+    try:
+        wait_for(lambda: pool.stats()["depth"]["agent_a"] == 2)
+        assert pool.get_token("agent_a")["access_token"] in {"token_1", "token_2"}
+        assert pool.stats()["hits"] == 1
+
+        # The taken token is replaced
+        wait_for(lambda: pool.stats()["created"] == 3 and pool.stats()["depth"]["agent_a"] == 2)
+
+        # Tokens past max_age are never handed out
+        clock.now = 30
+        assert pool.stats()["depth"]["agent_a"] == 0
+        assert pool.get_token("agent_a")["agent_id"] == "agent_a"
+        stats = pool.stats()
+        assert (stats["hits"], stats["misses"], stats["expired"]) == (1, 2, 2)
+        assert stats["hit_rate"] == 1 / 3
+    finally:
+        pool.stop()
+
+
+def test_unpooled_agents_are_not_misses():
+    pool = WebCallTokenPool(FakeClient(), ["agent_a"], size=2, clock=FakeClock())
+
+    assert pool.get_token("agent_b")["agent_id"] == "agent_b"
+
+    stats = pool.stats()
+    assert (stats["unpooled"], stats["misses"], stats["hit_rate"]) == (1, 0, 0.0)
@@ -0,0 +1,22 @@
+import math
+
+from spending_analytics import AccountColumns, compare_periods, summary
+
+TODAY = "2025-03-15"
+
+
+def test_no_spending_is_positive_zero():
+    columns = AccountColumns([("2025-03-01", "deposit", 100.0, "Payroll", False)], 100.0)
+
+    result = summary(columns, TODAY)
+
+    assert math.copysign(1, result["total_spent"]) == 1
+    assert math.copysign(1, result["this_month"]["current"]["spent"]) == 1
+    assert math.copysign(1, compare_periods(columns, "month", TODAY)["previous"]["spent"]) == 1
+
+
+def test_empty_account_is_positive_zero():
+    result = summary(AccountColumns([], None), TODAY)
+
+    assert math.copysign(1, result["total_spent"]) == 1
+    assert result["transactions"] == 0
@@ -0,0 +1,138 @@
+import csv
+import heapq
+import io
+import json
+
+from nessie_gateway import TRANSACTION_TYPES
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet export is optional
+    pa = pq = None
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+COLUMNS = ["account_id", "account_type", "account_nickname", "transaction_id", "type", "date",
+           "amount", "description", "payer_id", "payee_id", "status", "medium"]
+
+CHUNK_BYTES = 64 * 1024  # flush encoded output in chunks about this size
+PARQUET_ROW_GROUP = 10000
+
+
+def export_rows(ledger, customer_id, page_size=1000):
+    """
+    Every transaction of every account the customer has, newest first within
+    each account, as tuples in COLUMNS order.
+
+    Each transaction type is read as its own keyset-paged stream and the
+    streams are k-way merged by date, so only one page per type is in memory.
+    """
+    for account in ledger.accounts(customer_id):
+        streams = [ledger.iter_transactions(account["_id"], kind, page_size) for kind in TRANSACTION_TYPES.values()]
+        # Rows are (id, type, date, ...) - merge on (date, id) to match the per-type order
+        for row in heapq.merge(*streams, key=lambda row: (row[2], row[0]), reverse=True):
+            yield (account["_id"], account.get("type"), account.get("nickname"), *row)
+
+
+def chunked(pieces, size=CHUNK_BYTES):
+    """
+    Group small encoded pieces into chunks of roughly `size` bytes
+    """
+    buffer, buffered = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def encode_ndjson(rows):
+    for row in rows:
+        yield (json.dumps(dict(zip(COLUMNS, row))) + "\n").encode()
+
+
+def encode_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        # Hand off whatever has been written and reuse the buffer
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file that collects bytes until they are drained, so parquet
+    output can be streamed as it is produced
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def encode_parquet(rows, row_group=PARQUET_ROW_GROUP):
+    schema = pa.schema([
+        (name, pa.float64() if name == "amount" else pa.string()) for name in COLUMNS
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def write(batch):
+        # Transpose the buffered rows into one array per column
+        columns = [pa.array(column, type=field.type) for column, field in zip(zip(*batch), schema)]
+        writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= row_group:
+            write(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write(batch)
+    writer.close()
+    yield sink.drain()
+
+
+def export_customer(ledger, customer_id, export_format="ndjson"):
+    """
+    Stream a customer's accounts and transactions in the given format as byte chunks
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if export_format == "parquet" and pq is None:
+        raise ValueError("parquet export requires pyarrow to be installed")
+
+    rows = export_rows(ledger, customer_id)
+    if export_format == "parquet":
+        return encode_parquet(rows)
+    encoder = encode_ndjson if export_format == "ndjson" else encode_csv
+    return chunked(encoder(rows))